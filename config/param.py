@@ -12,6 +12,8 @@ PLC_SERVER_PORT = 2000       # TCP 端口
 # ==================== 文件路径配置 ====================
 # 标定文件路径
 CALIBRATION_FILE_PATH = os.path.join(_project_root, "assets", "calibration", "affine_matrix.txt")
+# 相机内参和畸变系数 (OpenCV 标定输出的 YAML，字段 camera_matrix / distortion_coefficients)，文件不存在时不做去畸变
+CAMERA_INTRINSICS_FILE_PATH = os.path.join(_project_root, "assets", "calibration", "camera_intrinsics.yml")
 
 # 扫描区域配置文件
 SCAN_AREA_FILES = [
@@ -21,6 +23,9 @@ SCAN_AREA_FILES = [
     os.path.join(_project_root, "config", "scan_areas", "area_D.txt"),
 ]
 
+# 是否只处理PLC当前区域 (Start指令轮换的A-D扫描区域)，False 时处理整幅图像
+SCAN_AREA_ROI_ENABLED = True
+
 # ==================== 角度校正参数 ====================
 # PLC中角度行程不一样需要微调
 angle_deg_judge = 5.88
@@ -32,4 +37,126 @@ hsv_range = {
     'red2': ((156, 100, 20), (180, 255, 255)),
     'green': ((40, 50, 10), (90, 255, 255)),
     'blue': ((90, 85, 13), (160, 255, 255)),
-}
\ No newline at end of file
+}
+
+# 颜色分割方式: 'lut' 将上面的 HSV 阈值预编译为 BGR 查找表(每帧一次查表)，'hsv' 为逐帧 HSV 转换 + inRange
+COLOR_SEGMENT_MODE = 'lut'
+# 查找表每通道量化位数: 8 为完整 256^3 表(16MB，结果与 HSV 判断一致)，5 为 32^3 量化表(32KB)
+COLOR_LUT_BITS = 8
+
+# ==================== 图像处理加速配置 ====================
+# 金字塔(由粗到精)检测层级: 0 为全分辨率处理，1/2 表示在 2x/4x 降采样图上分割，再在目标周围窗口内以全分辨率精化
+PYRAMID_LEVEL = 0
+# 分条并行分割的线程数，<=1 为单线程；可用 python src/processimg.py <图像> --bench-workers 测试不同线程数的耗时
+STRIP_WORKERS = 1
+
+# ==================== 上报形状配置 ====================
+# 需要上报给PLC的形状 (可选: circle, square, rectangle, diamond, trapezoid, triangle, hexagon)
+# 只有可能成为这些形状的轮廓才做凸包逼近、角度和颜色计算，其余形状只计数
+REPORT_SHAPES = ('circle', 'square')
+# 调试: True 时对所有形状做完整分析并在画面中绘制
+DEBUG_ALL_SHAPES = False
+
+# ==================== 画面变化检测配置 ====================
+# 传送带静止时跳过重复的图像处理，复用上一次的检测结果 (比较处理区域的低分辨率缩略图)，默认关闭(每帧处理)
+FRAME_GATING_ENABLED = False
+# 缩略图像素差阈值 (0-255)，超过该值的像素视为变化
+FRAME_CHANGE_THRESHOLD = 12
+# 变化像素占比超过该值时重新处理
+FRAME_CHANGE_RATIO = 0.002
+# 强制刷新间隔(秒)，即使画面没有变化也重新处理，<=0 表示不强制刷新
+FRAME_REFRESH_INTERVAL = 2.0
+
+# ==================== 目标跟踪配置 ====================
+# 为检测结果分配跨帧稳定的编号和速度，两次全图扫描之间只在已知目标周围的窗口内检测，默认关闭(每帧全区域检测)
+TRACKING_ENABLED = False
+# 全图扫描间隔(秒)，用于发现新进入的目标
+TRACK_FULL_SCAN_INTERVAL = 1.0
+
+# ==================== 多帧一致性配置 ====================
+# PLC请求时汇总之后若干帧的检测结果(位置取中位数、角度取圆周平均)，代替固定等待0.8秒后取单帧结果；
+# 默认关闭(按原方式等待0.8秒后取单帧结果)。与跟踪同时启用时，请求之后的第一帧做全图扫描
+CONSENSUS_ENABLED = False
+# 物体至少出现的帧数，连续这么多帧结果一致时提前返回
+CONSENSUS_MIN_FRAMES = 3
+# 最多收集的帧数
+CONSENSUS_MAX_FRAMES = 5
+# 最长等待时间(秒)
+CONSENSUS_TIMEOUT = 1.5
+# 不同帧中同一物体的最大位置偏差(机械臂坐标单位)
+CONSENSUS_MATCH_DISTANCE = 5.0
+
+# ==================== 图像处理流水线配置 ====================
+# 颜色分割之后对前景掩膜依次执行的处理阶段，格式为 (名称, 参数)，可选:
+#   open / close / erode / dilate: {'ksize': 核尺寸, 'shape': 'ellipse' | 'rect' | 'cross', 'iterations': 次数}
+#   median: {'ksize': 核尺寸}
+# 例如去掉中值滤波、改用矩形核开运算以提高速度；分条并行和金字塔模式的重叠行数与核缩放均由此列表推导
+# 可用 python src/processimg.py <图像> --bench-stages 测量每个阶段的耗时
+PIPELINE_STAGES = [
+    ('open', {'ksize': 5, 'shape': 'ellipse'}),
+    ('close', {'ksize': 9, 'shape': 'ellipse'}),
+    ('median', {'ksize': 5}),
+]
+
+# ==================== 性能统计配置 ====================
+# 记录各处理阶段(颜色分割/形态学/轮廓/逐轮廓分析/绘制/相机格式转换等)的耗时，开销很小，可在生产环境中常开
+# 统计结果可通过 processor.timer.summary() 读取
+PROFILING_ENABLED = True
+# 每个阶段保留最近多少次记录用于计算均值和 p50/p95/p99
+PROFILE_WINDOW = 200
+# 周期打印统计的间隔(秒)，0 表示不打印
+PROFILE_DUMP_INTERVAL = 60
+
+# ==================== 中心和角度计算配置 ====================
+# 'vertex':  默认，中心取最小外接矩形中心，角度由逼近多边形对边中点连线计算，与PLC侧现有的角度约定一致
+# 'moments': 可选，中心取轮廓质心，正方形/矩形/菱形的角度由轮廓矩计算(亚像素、亚度级，不依赖逼近多边形的顶点顺序)
+#            注意上报约定随之变化: 正方形角度为凸包边界的4次谐波方向，范围 [0, 90)；矩形/菱形为二阶中心矩主轴方向，
+#            菱形取长对角线方向(而非对边中点连线)；中心点为质心。启用前需同步修改PLC侧的角度换算
+ORIENTATION_METHOD = 'vertex'
+
+# ==================== Bayer快速路径配置 ====================
+# 相机输出8位Bayer数据时不调用SDK转换为全分辨率RGB，而是把每个2x2单元直接合成一个BGR像素(半宽半高)进行检测，
+# 只在目标周围的窗口内做全分辨率去马赛克以精化轮廓；False(默认) 时按原方式转换为RGB后处理。
+# 启用前可用 python src/processimg.py <图像> --check-bayer 对比两种方式的检测结果
+BAYER_FAST_PATH = False
+
+# ==================== 黑白相机配置 ====================
+# 相机输出 Mono8 时直接在单通道图像上做灰度阈值分割(不转换为RGB、不做HSV)，形状/中心/角度照常计算，颜色上报为 unknown；
+# False(默认) 时按原方式转换为RGB后按HSV颜色处理
+MONO_PIPELINE = False
+# 灰度阈值 (1-255)，0 表示每帧由直方图自动计算(Otsu)
+MONO_THRESHOLD = 0
+# 'bright': 工件比背景亮；'dark': 工件比背景暗
+MONO_POLARITY = 'bright'
+
+# ==================== 形状分类配置 ====================
+# 'rules': 按逼近多边形的顶点数和边长/角度规则判断形状
+# 'radial': 与模板库中的参考形状比较归一化径向特征(与位置、尺寸、旋转无关)；'hu': 比较Hu不变矩(圆和六边形等区分度较差)
+SHAPE_CLASSIFIER = 'rules'
+# 参考形状图像目录，文件名即形状名称(如 square.png)，新增产品形状时放入一张白底黑形或黑底白形的图像即可
+SHAPE_TEMPLATE_DIR = os.path.join(_project_root, "assets", "shape_templates")
+# 与最近参考形状的特征距离超过该值时判为 unknown
+SHAPE_TEMPLATE_MAX_DISTANCE = 0.05
+
+# ==================== 多区域并行配置 ====================
+# 每帧同时检测全部扫描区域(每个区域一个处理器，在线程池中并行)，结果按区域缓存；
+# PLC 请求区域1时等待一帧新图像，同一周期内区域2-4的请求直接使用该帧的缓存结果。启用后不使用多帧一致性和跟踪
+MULTI_AREA_ENABLED = False
+# 缓存结果的有效时间(秒)，超过后重新等待新帧
+MULTI_AREA_MAX_AGE = 2.0
+# 等待新帧处理完成的超时时间(秒)
+MULTI_AREA_TIMEOUT = 2.0
+
+# ==================== 分块更新配置 ====================
+# 将处理区域划分为块，每帧只重新分割块均值与上次分割时相比有变化的块以及上一帧目标所在的块，其余块沿用之前的分割结果，
+# 使分割耗时与画面中的活动量成正比；统计见 processor.tile_stats()
+# 注意这是近似方法: 块只按采样点的均值比较，未采样像素的变化(细小的划痕、边缘)可能被漏掉，直到强制整幅刷新；
+# 同一个 Processor 依次处理不相关的图像(离线测试、标定)时不应启用
+# 块边长(像素)，0 表示每帧整幅分割(默认)，启用时推荐 64
+DIRTY_TILE_SIZE = 0
+# 块均值差阈值 (0-255)，任一通道超过该值的块重新分割
+DIRTY_TILE_THRESHOLD = 3.0
+# 每隔多少帧整幅重新分割一次，0 表示不强制
+DIRTY_TILE_REFRESH_FRAMES = 100
+# 自动(Otsu)灰度阈值的容差(灰度级)：阈值变化不超过该值时沿用上次的阈值，只有超过时才整幅重新分割
+DIRTY_TILE_MONO_TOLERANCE = 4
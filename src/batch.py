@@ -0,0 +1,131 @@
+#批量处理模块：把大量图像分发到多个工作进程并行检测(例如修改颜色阈值后重新处理归档图像)，结果按输入顺序返回
+#每个工作进程持有自己的 Processor；图像数组经共享内存传给工作进程，不做序列化拷贝
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+
+_worker_processor = None
+_worker_shm = OrderedDict()   # 工作进程中已映射的共享内存块: 名称 -> SharedMemory，按最近使用排列
+_worker_shm_limit = 1         # 保留的映射数上限，等于主进程的槽位数
+
+
+def _init_worker(config_overrides, shm_limit=1):
+    """
+    工作进程初始化：创建该进程的 Processor。进程间已经并行，关闭 OpenCV 内部线程和分条并行，避免线程数超过核数；
+    批量图像之间没有连续性，关闭分块更新
+    """
+    global _worker_processor, _worker_shm_limit
+    from processimg import Processor
+    _worker_shm_limit = shm_limit
+    cv2.setNumThreads(1)
+    _worker_processor = Processor()
+    _worker_processor.strip_workers = 1
+    _worker_processor.tile_size = 0
+    for name, value in (config_overrides or {}).items():
+        setattr(_worker_processor, name, value)
+
+
+def _attach(name):
+    """按名称复用已映射的共享内存块。主进程重新分配槽位后旧名称不再出现，其映射按最近最少使用被关闭"""
+    shm = _worker_shm.get(name)
+    if shm is not None:
+        _worker_shm.move_to_end(name)
+        return shm
+    shm = _worker_shm[name] = shared_memory.SharedMemory(name=name)
+    while len(_worker_shm) > _worker_shm_limit:
+        _, old = _worker_shm.popitem(last=False)
+        old.close()
+    return shm
+
+
+def _process_task(index, source, roi_rect):
+    """
+    处理一帧。source 为 (共享内存名称, 形状, 数据类型) 或图像文件路径。
+    返回 (index, DetectedObject 列表)，frame_id 为该帧在本批中的序号；无法读取的图像返回 None。
+    """
+    if isinstance(source, str):
+        img = cv2.imread(source)
+        if img is None:
+            return index, None
+        if img.ndim == 3 and img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+    else:
+        name, shape, dtype = source
+        img = np.ndarray(shape, dtype=dtype, buffer=_attach(name).buf)
+    objects, _ = _worker_processor.detect(img, roi_rect)
+    return index, _worker_processor.report_objects(objects, frame_id=index)
+
+
+class _FrameSlot:
+    """主进程中一个可复用的共享内存槽位，图像变大时重新分配"""
+    def __init__(self):
+        self.shm = None
+
+    def write(self, img):
+        img = np.ascontiguousarray(img)
+        if self.shm is None or self.shm.size < img.nbytes:
+            self.release()
+            self.shm = shared_memory.SharedMemory(create=True, size=max(img.nbytes, 1))
+        np.ndarray(img.shape, dtype=img.dtype, buffer=self.shm.buf)[...] = img
+        return (self.shm.name, img.shape, img.dtype.str)
+
+    def release(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class ProcessorPool:
+    """
+    多进程批量检测。用法:
+        with ProcessorPool(workers=4) as pool:
+            for objects in pool.map(frames):
+                ...
+    frames 可以是图像数组(BGR)或图像文件路径的列表/迭代器。数组写入共享内存槽位后由工作进程直接映射读取，
+    文件路径则由工作进程自行读取解码，主进程不做解码。同时在处理中的帧数不超过 max_pending，
+    因此迭代器可以是惰性读取的大量图像。
+    config_overrides 为 {Processor属性: 值}，在每个工作进程创建 Processor 后设置(例如 {'pyramid_level': 1})。
+    """
+    def __init__(self, workers=None, max_pending=None, config_overrides=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers # 每个工作进程处理一帧的同时主进程可再准备一帧
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(config_overrides, self.max_pending))
+        self._slots = [_FrameSlot() for _ in range(self.max_pending)]
+
+    def map(self, frames, roi_rect=None):
+        """逐帧返回检测结果(DetectedObject 列表)，顺序与输入相同；无法读取的图像文件对应 None"""
+        pending = deque()
+        for index, frame in enumerate(frames):
+            if len(pending) >= self.max_pending:
+                yield pending.popleft().result()[1]
+            # 槽位按序号轮流使用：写入第 index 帧时，使用同一槽位的第 index-max_pending 帧已经取回结果
+            source = frame if isinstance(frame, str) else self._slots[index % self.max_pending].write(frame)
+            pending.append(self._executor.submit(_process_task, index, source, roi_rect))
+        while pending:
+            yield pending.popleft().result()[1]
+
+    def process_many(self, frames, roi_rect=None):
+        """处理全部图像，返回按输入顺序排列的结果列表"""
+        return list(self.map(frames, roi_rect))
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for slot in self._slots:
+            slot.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def process_many(frames, workers=None, roi_rect=None, config_overrides=None):
+    """创建进程池处理一批图像后关闭，返回按输入顺序排列的结果列表(见 ProcessorPool)"""
+    with ProcessorPool(workers, config_overrides=config_overrides) as pool:
+        return pool.process_many(frames, roi_rect)
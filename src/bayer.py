@@ -0,0 +1,105 @@
+#Bayer原始数据快速路径：不做全分辨率去马赛克，把每个2x2单元直接合成一个BGR像素得到半宽半高的图像用于检测，
+#只在目标周围的精化窗口内做全分辨率去马赛克
+import numpy as np
+import cv2
+
+# 各排列方式中 R / G1 / G2 / B 在2x2单元内的 (行, 列)，名称为左上角开始的排列顺序
+BAYER_LAYOUTS = {
+    'RGGB': ((0, 0), (0, 1), (1, 0), (1, 1)),
+    'BGGR': ((1, 1), (0, 1), (1, 0), (0, 0)),
+    'GRBG': ((0, 1), (0, 0), (1, 1), (1, 0)),
+    'GBRG': ((1, 0), (0, 0), (1, 1), (0, 1)),
+}
+
+# 全分辨率去马赛克使用的转换码 (OpenCV 的 RGGB/BGGR/GRBG/GBRG 别名与左上角排列一致)
+BAYER_TO_BGR = {
+    'RGGB': cv2.COLOR_BayerRGGB2BGR,
+    'BGGR': cv2.COLOR_BayerBGGR2BGR,
+    'GRBG': cv2.COLOR_BayerGRBG2BGR,
+    'GBRG': cv2.COLOR_BayerGBRG2BGR,
+}
+
+
+def bayer_half_bgr(raw, pattern='RGGB', out=None):
+    """
+    (H, W) uint8 Bayer原始数据 -> (H/2, W/2, 3) BGR。每个2x2单元取 R、B 和两个 G 的均值，
+    直接通过步长为2的切片视图读取，不做插值。out 为可复用的输出缓冲区。
+    """
+    (ry, rx), (g1y, g1x), (g2y, g2x), (by, bx) = BAYER_LAYOUTS[pattern]
+    h, w = raw.shape[0] // 2, raw.shape[1] // 2
+    if out is None or out.shape != (h, w, 3):
+        out = np.empty((h, w, 3), dtype=np.uint8)
+    def plane(oy, ox):
+        return raw[oy:oy + 2 * h:2, ox:ox + 2 * w:2]
+    out[..., 0] = plane(by, bx)
+    out[..., 2] = plane(ry, rx)
+    # 两个G的均值: (g1 + g2 + 1) // 2，先在 uint16 中相加避免溢出
+    green = plane(g1y, g1x).astype(np.uint16)
+    green += plane(g2y, g2x)
+    green += 1
+    green >>= 1
+    out[..., 1] = green
+    return out
+
+
+def bgr_to_bayer(img, pattern='RGGB'):
+    """(H, W, 3) BGR 图像按排列方式取样为 (H, W) Bayer原始数据，用于没有相机时验证Bayer路径"""
+    raw = np.empty(img.shape[:2], dtype=np.uint8)
+    (ry, rx), (g1y, g1x), (g2y, g2x), (by, bx) = BAYER_LAYOUTS[pattern]
+    for (oy, ox), channel in (((ry, rx), 2), ((g1y, g1x), 1), ((g2y, g2x), 1), ((by, bx), 0)):
+        raw[oy::2, ox::2] = img[oy::2, ox::2, channel]
+    return raw
+
+
+class BayerFrame:
+    """
+    一帧 Bayer 原始数据，可作为 Processor.detect 的输入代替BGR图像。
+    shape 与对应的全分辨率BGR图像相同；half() 为整帧的半分辨率BGR图像(首次调用时生成，之后复用，也用于界面显示)；
+    crop() 返回ROI视图(ROI起点需为偶数，保持排列相位)；window() 对视图内的小窗口做全分辨率去马赛克。
+    只支持8位数据。
+    """
+    ndim = 3 # 与 shape 一致，按三通道彩色图像处理
+
+    def __init__(self, raw, pattern='RGGB', half_out=None):
+        if raw.dtype != np.uint8 or raw.ndim != 2:
+            raise ValueError("BayerFrame 只支持 (H, W) 的8位原始数据")
+        if pattern not in BAYER_LAYOUTS:
+            raise ValueError(f"未知的Bayer排列: {pattern}，可选 {list(BAYER_LAYOUTS)}")
+        self.raw = raw
+        self.pattern = pattern
+        self.rect = (0, 0, raw.shape[1], raw.shape[0])   # 在整帧中的 (x, y, w, h)
+        self.shape = (raw.shape[0], raw.shape[1], 3)
+        self._root = self
+        self._half = None
+        self._half_out = half_out
+
+    def crop(self, x, y, w, h):
+        """ROI视图，x/y 为相对本视图的偏移，需为偶数"""
+        if x % 2 or y % 2:
+            raise ValueError("Bayer ROI 的起点必须为偶数")
+        view = object.__new__(BayerFrame)
+        view.raw, view.pattern, view._root = self.raw, self.pattern, self._root
+        rx, ry = self.rect[0] + x, self.rect[1] + y
+        view.rect = (rx, ry, w, h)
+        view.shape = (h, w, 3)
+        return view
+
+    def half(self):
+        """本视图的半分辨率BGR图像 (h/2, w/2, 3)，为整帧半分辨率图像的切片"""
+        root = self._root
+        if root._half is None:
+            root._half = bayer_half_bgr(root.raw, root.pattern, out=root._half_out)
+        x, y, w, h = self.rect
+        return root._half[y // 2:(y + h) // 2, x // 2:(x + w) // 2]
+
+    def window(self, x0, y0, x1, y1, pad=2):
+        """视图内 [x0, x1) x [y0, y1) 窗口的全分辨率BGR图像。外扩pad像素去马赛克后再裁剪，避免窗口边缘的插值误差"""
+        ox, oy = self.rect[:2]
+        full_h, full_w = self.raw.shape
+        gx0, gy0 = ox + x0, oy + y0
+        gx1, gy1 = ox + x1, oy + y1
+        # 外扩后的起点对齐到偶数，保持排列相位
+        ax0, ay0 = max(gx0 - pad, 0) & ~1, max(gy0 - pad, 0) & ~1
+        ax1, ay1 = min(gx1 + pad, full_w), min(gy1 + pad, full_h)
+        bgr = cv2.cvtColor(self.raw[ay0:ay1, ax0:ax1], BAYER_TO_BGR[self.pattern])
+        return bgr[gy0 - ay0:gy1 - ay0, gx0 - ax0:gx1 - ax0]
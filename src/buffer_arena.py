@@ -0,0 +1,72 @@
+#缓冲区复用模块：为图像处理流水线提供可复用的输出缓冲区，避免每帧重复分配整帧大小的数组
+import numpy as np
+
+
+class BufferArena:
+    """
+    按名称管理的输出缓冲区池，配合 OpenCV 的 dst= 参数和 numpy 的 out= 参数使用。
+    每个名称对应一块缓冲区，请求的尺寸不超过已有容量时直接返回其左上角的切片视图，不重新分配；
+    只有在帧尺寸变化(begin_frame 传入的形状改变)时才整体失效。
+    """
+    # 超过该字节数的分配计为"大数组"分配，稳态处理时该计数不应再增长
+    LARGE_ARRAY_BYTES = 64 * 1024
+
+    def __init__(self):
+        self.frame_shape = None
+        self._buffers = {}
+        # --- 统计计数 ---
+        self.requests = 0               # 缓冲区请求次数
+        self.allocations = 0            # 实际分配次数
+        self.large_allocations = 0      # 大数组分配次数
+        self.allocated_bytes = 0        # 累计分配字节数
+        self.invalidations = 0          # 因帧尺寸变化导致的失效次数
+
+    def begin_frame(self, frame_shape):
+        """每帧处理前调用，帧尺寸变化时释放所有缓冲区"""
+        frame_shape = tuple(frame_shape)
+        if frame_shape != self.frame_shape:
+            if self.frame_shape is not None:
+                self.invalidations += 1
+            self._buffers.clear()
+            self.frame_shape = frame_shape
+
+    def get(self, name, shape, dtype=np.uint8):
+        """返回名称为name、形状为shape的缓冲区(可能是更大缓冲区的切片视图)，内容未初始化"""
+        self.requests += 1
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        buf = self._buffers.get(name)
+        if buf is None or buf.dtype != dtype or buf.ndim != len(shape) \
+                or any(have < need for have, need in zip(buf.shape, shape)):
+            # 容量不足时按各维度的较大值重新分配，避免尺寸来回变化时反复分配
+            if buf is not None and buf.dtype == dtype and buf.ndim == len(shape):
+                alloc_shape = tuple(max(have, need) for have, need in zip(buf.shape, shape))
+            else:
+                alloc_shape = shape
+            buf = np.empty(alloc_shape, dtype=dtype)
+            self._buffers[name] = buf
+            self.allocations += 1
+            self.allocated_bytes += buf.nbytes
+            if buf.nbytes > self.LARGE_ARRAY_BYTES:
+                self.large_allocations += 1
+        return buf[tuple(slice(0, n) for n in shape)]
+
+    def get_contiguous(self, name, shape, dtype=np.uint8):
+        """
+        与 get 相同，但返回C连续的数组(按元素总数复用一维缓冲区)。
+        用于 np.take 等只接受连续数组、否则会在内部临时复制整个数组的函数。
+        """
+        return self.get(name, (int(np.prod(shape)),), dtype).reshape(shape)
+
+    def stats(self):
+        """返回统计计数字典"""
+        return {
+            "frame_shape": self.frame_shape,
+            "buffers": len(self._buffers),
+            "resident_bytes": sum(buf.nbytes for buf in self._buffers.values()),
+            "requests": self.requests,
+            "allocations": self.allocations,
+            "large_allocations": self.large_allocations,
+            "allocated_bytes": self.allocated_bytes,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,280 @@
+#标定模型：像素坐标 -> 机械臂坐标。支持仿射/单应矩阵，以及可选的相机内参和畸变系数(只对检测到的点去畸变，不处理整幅图像)
+import os
+import numpy as np
+import cv2
+
+
+def load_intrinsics(filepath):
+    """
+    读取 OpenCV 标定输出的相机内参文件(YAML/XML，字段 camera_matrix 和 distortion_coefficients)。
+    文件未配置或不存在时返回 (None, None)，即不做去畸变。
+    """
+    if not filepath or not os.path.exists(filepath):
+        return None, None
+    try:
+        fs = cv2.FileStorage(filepath, cv2.FILE_STORAGE_READ)
+        camera_matrix = fs.getNode("camera_matrix").mat()
+        dist_coeffs = fs.getNode("distortion_coefficients").mat()
+        fs.release()
+    except Exception as e:
+        print(f"加载相机内参文件 '{filepath}' 时发生错误: {e}")
+        return None, None
+    if camera_matrix is None or camera_matrix.shape != (3, 3) or dist_coeffs is None:
+        print(f"错误：相机内参文件 '{filepath}' 缺少 camera_matrix(3x3) 或 distortion_coefficients！")
+        return None, None
+    return camera_matrix, dist_coeffs
+
+
+class CalibrationModel:
+    """
+    像素坐标到机械臂坐标的转换，参数在创建时整理好(启动时创建一次)，之后每帧对所有目标一次性计算:
+        1. 有畸变系数时，用 cv2.undistortPoints 将检测点去畸变(P=camera_matrix，结果仍为像素坐标)
+        2. 齐次行向量乘以 3x3 矩阵: [X, Y, W] = [x, y, 1] @ matrix，结果为 (X/W, Y/W)
+           matrix 与 affine_matrix.txt 的格式相同(行向量形式)，仿射矩阵第三列为 (0, 0, 1)，即 W=1
+        3. negate 为 True 时结果取反(C#标定程序中Y轴方向向下)
+    """
+    def __init__(self, matrix, camera_matrix=None, dist_coeffs=None, negate=True):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+        self.negate = negate
+        self.camera_matrix = None
+        self.dist_coeffs = None
+        if camera_matrix is not None and dist_coeffs is not None:
+            dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).reshape(-1)
+            if np.any(dist_coeffs != 0): # 畸变系数全为0时跳过去畸变
+                self.camera_matrix = np.ascontiguousarray(camera_matrix, dtype=np.float64)
+                self.dist_coeffs = dist_coeffs
+
+    @property
+    def undistorts(self):
+        return self.dist_coeffs is not None
+
+    def undistort(self, points):
+        """(N, 2) 像素坐标去畸变，返回去畸变后的像素坐标 (N, 2)；没有畸变参数时原样返回"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.dist_coeffs is None or len(points) == 0:
+            return points
+        return cv2.undistortPoints(points.reshape(-1, 1, 2), self.camera_matrix, self.dist_coeffs,
+                                   P=self.camera_matrix).reshape(-1, 2)
+
+    def pixel_to_robot(self, points):
+        """(N, 2) 全图像素坐标 -> (N, 2) 机械臂坐标"""
+        points = self.undistort(points)
+        homog = np.empty((len(points), 3))
+        homog[:, :2] = points
+        homog[:, 2] = 1.0
+        mapped = homog @ self.matrix
+        robot = mapped[:, :2] / mapped[:, 2:3]
+        return -robot if self.negate else robot
+
+
+# ==================== 标定求解与验证 ====================
+
+def read_point_pairs(filepath):
+    """
+    读取点对CSV，每行为 pixel_x, pixel_y, robot_x, robot_y (可有表头，# 开头为注释)。
+    robot_x/robot_y 为发送给PLC的机械臂坐标(即取反后的值)。返回 (pixels (N, 2), robots (N, 2))。
+    """
+    data = np.genfromtxt(filepath, delimiter=',', comments='#', dtype=np.float64)
+    data = np.atleast_2d(data)
+    data = data[~np.isnan(data).any(axis=1)] # 去掉表头等无法解析的行
+    if data.shape[1] < 4:
+        raise ValueError(f"点对文件 '{filepath}' 每行需要 pixel_x, pixel_y, robot_x, robot_y 四列")
+    return data[:, :2], data[:, 2:4]
+
+def detect_target_points(frame_csv, processor=None, shape=None):
+    """
+    由标定图像获取点对: frame_csv 每行为 图像路径, robot_x, robot_y (标定物在该图像中时的机械臂坐标)。
+    用 Processor 检测每幅图像，标定物应为图像中唯一的目标(shape 不为空时只看该形状)，中心点作为像素坐标。
+    检测不到或检测到多个目标的图像跳过并提示。返回 (pixels, robots, 使用的图像路径列表)。
+    默认的 Processor 关闭分块更新，shape 不在上报形状中时也对该形状做完整分析；
+    传入的 processor 不分析 shape 时抛出 ValueError。
+    """
+    if processor is None:
+        from processimg import Processor
+        processor = Processor()
+        processor.tile_size = 0 # 各标定图像互不相关，不沿用上一幅图像的分割结果
+        if shape is not None and shape not in processor.reported_shapes:
+            processor.reported_shapes += (shape,)
+    if shape is not None and not (processor.debug_all_shapes or shape in processor.reported_shapes):
+        raise ValueError(f"形状 '{shape}' 不在处理器的上报形状 {processor.reported_shapes} 中，无法检测该形状的标定物")
+    base_dir = os.path.dirname(os.path.abspath(frame_csv))
+    pixels, robots, used = [], [], []
+    with open(frame_csv, encoding='utf-8') as f:
+        for line in f:
+            fields = [v.strip() for v in line.split(',')]
+            if len(fields) < 3 or fields[0].startswith('#'):
+                continue
+            try:
+                robot = (float(fields[1]), float(fields[2]))
+            except ValueError:
+                continue # 表头
+            path = fields[0] if os.path.isabs(fields[0]) else os.path.join(base_dir, fields[0])
+            img = cv2.imread(path)
+            if img is None:
+                print(f"警告：无法读取标定图像 '{path}'，跳过")
+                continue
+            objects, _ = processor.detect(img)
+            if shape is not None:
+                objects = [obj for obj in objects if obj["shape"] == shape]
+            if len(objects) != 1:
+                print(f"警告：标定图像 '{path}' 中检测到 {len(objects)} 个目标(应为1个)，跳过")
+                continue
+            pixels.append((objects[0]["pixel_x"], objects[0]["pixel_y"]))
+            robots.append(robot)
+            used.append(path)
+    return np.array(pixels, dtype=np.float64).reshape(-1, 2), np.array(robots, dtype=np.float64).reshape(-1, 2), used
+
+def fit_calibration(pixels, robots, model='affine', ransac_threshold=0.5, camera_matrix=None, dist_coeffs=None):
+    """
+    由点对拟合行向量形式的 3x3 标定矩阵(与 affine_matrix.txt 相同)，使用RANSAC剔除误配点。
+    model: 'affine' 至少3对点，'homography' 至少4对点；ransac_threshold 为内点的最大误差(机械臂坐标单位)。
+    给出相机内参时先对像素点去畸变，与 CalibrationModel 的计算顺序一致。
+    返回 (CalibrationModel, 内点掩码 (N,) 布尔)。
+    """
+    pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+    robots = np.asarray(robots, dtype=np.float64).reshape(-1, 2)
+    model_probe = CalibrationModel(np.eye(3), camera_matrix, dist_coeffs)
+    src = model_probe.undistort(pixels)
+    dst = -robots # 标定矩阵的结果取反后才是机械臂坐标
+    if model == 'affine':
+        if len(src) < 3:
+            raise ValueError("仿射标定至少需要3对点")
+        # estimateAffine2D 只接受 float32，RANSAC 只用来挑选内点，矩阵再由内点按 float64 最小二乘求解
+        M, inliers = cv2.estimateAffine2D(src.astype(np.float32), dst.astype(np.float32), method=cv2.RANSAC,
+                                          ransacReprojThreshold=ransac_threshold, maxIters=5000, confidence=0.999)
+        if M is None:
+            raise ValueError("仿射标定求解失败")
+        inliers = inliers.reshape(-1).astype(bool)
+        homog = np.hstack([src[inliers], np.ones((np.count_nonzero(inliers), 1))])
+        matrix = np.zeros((3, 3))
+        matrix[:, :2] = np.linalg.lstsq(homog, dst[inliers], rcond=None)[0] # 行向量形式: [x, y, 1] @ matrix
+        matrix[2, 2] = 1.0
+    elif model == 'homography':
+        if len(src) < 4:
+            raise ValueError("单应标定至少需要4对点")
+        H, inliers = cv2.findHomography(src, dst, cv2.RANSAC, ransac_threshold, maxIters=5000, confidence=0.999)
+        if H is None:
+            raise ValueError("单应标定求解失败")
+        matrix = H.T / H[2, 2]
+    else:
+        raise ValueError(f"未知的标定模型: {model}，可选 'affine' / 'homography'")
+    return CalibrationModel(matrix, camera_matrix, dist_coeffs), inliers.reshape(-1).astype(bool)
+
+def calibration_residuals(model, pixels, robots):
+    """所有点一次性重投影，返回每个点的残差向量 (N, 2) = 计算坐标 - 实际坐标(机械臂坐标单位)"""
+    return model.pixel_to_robot(pixels) - np.asarray(robots, dtype=np.float64).reshape(-1, 2)
+
+def residual_summary(residuals, limit=None):
+    """
+    残差统计: count / rms / mean_x / mean_y (系统偏移，用于发现标定漂移) / p95 / max，
+    limit 不为空时另外给出超过该误差的点数 over_limit。
+    """
+    residuals = np.asarray(residuals, dtype=np.float64).reshape(-1, 2)
+    if len(residuals) == 0:
+        return {"count": 0}
+    err = np.hypot(residuals[:, 0], residuals[:, 1])
+    summary = {
+        "count": len(err),
+        "rms": float(np.sqrt(np.mean(err ** 2))),
+        "mean_x": float(residuals[:, 0].mean()),
+        "mean_y": float(residuals[:, 1].mean()),
+        "p95": float(np.percentile(err, 95)),
+        "max": float(err.max()),
+    }
+    if limit is not None:
+        summary["over_limit"] = int(np.count_nonzero(err > limit))
+    return summary
+
+def format_matrix(matrix):
+    """按 affine_matrix.txt 的格式(每行三个数，以 ' , ' 分隔)输出，可被 Processor._load_affine_matrix 读取"""
+    return "\n".join(" , ".join(f"{v:.15G}" for v in row) for row in np.asarray(matrix, dtype=np.float64)) + "\n"
+
+def save_matrix(filepath, matrix):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write(format_matrix(matrix))
+
+def validate_log(log_csv, model, limit=None, chunk=None):
+    """
+    批量验证: log_csv 为记录的检测结果(pixel_x, pixel_y, robot_x, robot_y，robot为实际位置，例如机械臂抓取确认的坐标)，
+    一次性重投影所有记录并统计残差。chunk 不为空时按记录顺序每 chunk 条分段统计，用于观察随时间的漂移。
+    返回 (总体统计, 分段统计列表)。
+    """
+    pixels, robots = read_point_pairs(log_csv)
+    residuals = calibration_residuals(model, pixels, robots)
+    chunks = []
+    if chunk:
+        chunks = [residual_summary(residuals[i:i + chunk], limit) for i in range(0, len(residuals), chunk)]
+    return residual_summary(residuals, limit), chunks
+
+
+def _print_summary(title, summary):
+    if summary["count"] == 0:
+        print(f"{title}: 无数据")
+        return
+    text = (f"{title}: {summary['count']} 点, RMS {summary['rms']:.3f}, p95 {summary['p95']:.3f}, 最大 {summary['max']:.3f}, "
+            f"平均偏移 ({summary['mean_x']:+.3f}, {summary['mean_y']:+.3f})")
+    if "over_limit" in summary:
+        text += f", 超限 {summary['over_limit']}"
+    print(text)
+
+def _fit_and_report(pixels, robots, args, camera_matrix, dist_coeffs):
+    model, inliers = fit_calibration(pixels, robots, args.model, args.threshold, camera_matrix, dist_coeffs)
+    residuals = calibration_residuals(model, pixels, robots)
+    err = np.hypot(residuals[:, 0], residuals[:, 1])
+    print(f"{'序号':>4} {'像素x':>10} {'像素y':>10} {'机械臂x':>9} {'机械臂y':>9} {'残差':>8}")
+    for i, ((px, py), (rx, ry), e, ok) in enumerate(zip(pixels, robots, err, inliers)):
+        print(f"{i:>4} {px:>10.2f} {py:>10.2f} {rx:>9.2f} {ry:>9.2f} {e:>8.3f}{'' if ok else '  (离群)'}")
+    _print_summary("内点", residual_summary(residuals[inliers]))
+    _print_summary("全部", residual_summary(residuals))
+    print(f"标定矩阵 ({args.model}):\n{format_matrix(model.matrix)}", end="")
+    if args.output:
+        save_matrix(args.output, model.matrix)
+        print(f"已写入 {args.output}")
+    return model
+
+#标定工具
+#用法: python calibration.py fit <点对.csv> [--model affine|homography] [--threshold 0.5] [--output affine_matrix.txt]
+#      python calibration.py detect <图像列表.csv> [--shape circle] [...同上]   用 Processor 检测标定物得到点对
+#      python calibration.py validate <检测记录.csv> [--matrix 标定文件] [--limit 1.0] [--chunk 500]
+if __name__ == "__main__":
+    import argparse
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config"))
+    from param import CALIBRATION_FILE_PATH, CAMERA_INTRINSICS_FILE_PATH
+
+    parser = argparse.ArgumentParser(description="标定矩阵求解与验证")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("fit", "detect"):
+        p = sub.add_parser(name)
+        p.add_argument("csv")
+        p.add_argument("--model", choices=("affine", "homography"), default="affine")
+        p.add_argument("--threshold", type=float, default=0.5, help="RANSAC内点误差上限(机械臂坐标单位)")
+        p.add_argument("--output", help="写入的标定文件路径，不指定时只打印")
+        p.add_argument("--intrinsics", default=CAMERA_INTRINSICS_FILE_PATH, help="相机内参文件，不存在时不去畸变")
+        if name == "detect":
+            p.add_argument("--shape", help="只使用该形状的检测结果")
+    p = sub.add_parser("validate")
+    p.add_argument("csv")
+    p.add_argument("--matrix", default=CALIBRATION_FILE_PATH)
+    p.add_argument("--intrinsics", default=CAMERA_INTRINSICS_FILE_PATH)
+    p.add_argument("--limit", type=float, help="误差超过该值的记录计为超限")
+    p.add_argument("--chunk", type=int, help="按记录顺序每多少条分段统计")
+    args = parser.parse_args()
+
+    camera_matrix, dist_coeffs = load_intrinsics(args.intrinsics)
+    try:
+        if args.command == "fit":
+            _fit_and_report(*read_point_pairs(args.csv), args, camera_matrix, dist_coeffs)
+        elif args.command == "detect":
+            pixels, robots, used = detect_target_points(args.csv, shape=args.shape)
+            print(f"有效标定图像 {len(used)} 幅")
+            _fit_and_report(pixels, robots, args, camera_matrix, dist_coeffs)
+    except ValueError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    if args.command == "validate":
+        model = CalibrationModel(np.loadtxt(args.matrix, delimiter=','), camera_matrix, dist_coeffs)
+        overall, chunks = validate_log(args.csv, model, args.limit, args.chunk)
+        for i, summary in enumerate(chunks):
+            _print_summary(f"第 {i * args.chunk}-{i * args.chunk + summary['count'] - 1} 条", summary)
+        _print_summary("全部", overall)
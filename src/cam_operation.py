@@ -23,10 +23,25 @@ from tkinter import ttk
 import os
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, os.path.join(_project_root, "lib", "MvImport"))
+sys.path.insert(0, os.path.join(_project_root, "config"))
 
 from MvCameraControl_class import *
 from CameraParams_const import *
 from processimg import Processor
+from motion import FrameChangeDetector
+from tracker import ObjectTracker
+from consensus import ConsensusCollector
+from multi_area import MultiAreaProcessor
+from param import FRAME_GATING_ENABLED, FRAME_CHANGE_THRESHOLD, FRAME_CHANGE_RATIO, FRAME_REFRESH_INTERVAL
+from param import TRACKING_ENABLED, TRACK_FULL_SCAN_INTERVAL, BAYER_FAST_PATH, MONO_PIPELINE
+
+# 8位Bayer像素格式对应的排列方式(左上角开始)，用于Bayer快速路径
+BAYER8_PATTERNS = {
+    PixelType_Gvsp_BayerRG8: 'RGGB',
+    PixelType_Gvsp_BayerBG8: 'BGGR',
+    PixelType_Gvsp_BayerGR8: 'GRBG',
+    PixelType_Gvsp_BayerGB8: 'GBRG',
+}
 
 def Async_raise(tid, exctype):
     tid = ctypes.c_long(tid)
@@ -68,6 +83,25 @@ class CameraOperation():
         self.gain = gain
         self.latest_info = None
         self.processor = Processor()
+        # 当前处理的扫描区域 (x, y, w, h)，由PLC的Start指令通过AppUI设置，None表示全图处理
+        self.roi_rect = None
+        # 画面变化检测：处理区域没有变化时跳过图像处理，复用上一次的检测结果和叠加图形
+        self.frame_gate = FrameChangeDetector(FRAME_CHANGE_THRESHOLD, FRAME_CHANGE_RATIO, FRAME_REFRESH_INTERVAL) if FRAME_GATING_ENABLED else None
+        self.latest_objects = []        # 上一次处理的检测结果(含绘制信息)
+        self.latest_roi_rect = None
+        # 多目标跟踪：分配跨帧稳定的编号，两次全图扫描之间只在已知目标周围的窗口内检测
+        self.tracker = ObjectTracker(self.processor, full_scan_interval=TRACK_FULL_SCAN_INTERVAL) if TRACKING_ENABLED else None
+        # 帧发布: 取到图像时在锁内分配帧号(capture_id)，处理完成后以该帧号发布(frame_id)并通知等待者(多帧一致性收集)，
+        # 请求只使用帧号大于请求时 capture_id 的帧，即请求之后才采集的帧；frame_roi 为该帧使用的处理区域
+        self.frame_cond = threading.Condition()
+        self.capture_id = 0
+        self.frame_id = 0
+        self.frame_roi = None
+        self.waiting_requests = 0       # 正在等待新帧的请求数(多帧一致性收集、多区域结果)，期间不跳过静止帧
+        self.full_scan_requested = False # 下一次采集的帧做全图扫描(多帧一致性收集开始时设置，避免只用跟踪窗口的结果)
+        # 多区域模式: 每帧并行检测全部扫描区域并按区域缓存结果(见 Enable_multi_area)，None 表示按 roi_rect 处理单个区域
+        self.area_processor = None
+        self.cycle_frame_id = 0         # 本周期(PLC请求区域1时开始)可使用的最早帧号
         
     def To_hex_str(self,num):
         chaDic = {10: 'a', 11: 'b', 12: 'c', 13: 'd', 14: 'e', 15: 'f'}
@@ -170,6 +204,8 @@ class CameraOperation():
         self.b_open_device = False
         self.b_start_grabbing = False
         self.b_exit  = True
+        if self.area_processor is not None:
+            self.area_processor.close()
         print ("close device successfully!")
 
     def Set_trigger_mode(self,strMode):
@@ -239,6 +275,7 @@ class CameraOperation():
         img_buff = None
         buf_cache = None
         numArray = None
+        last_frame_skipped = False
         while True:
             ret = self.obj_cam.MV_CC_GetImageBuffer(stOutFrame, 1000)
             if 0 == ret:
@@ -259,6 +296,11 @@ class CameraOperation():
             else:
                 # print("no data, nret = "+self.To_hex_str(ret))
                 continue
+            with self.frame_cond:
+                self.capture_id += 1
+                capture_id = self.capture_id # 本帧的帧号，处理完成后以此发布
+                full_scan = self.full_scan_requested
+                self.full_scan_requested = False
 
             #转换像素结构体赋值
             stConvertParam = MV_CC_PIXEL_CONVERT_PARAM()
@@ -268,54 +310,124 @@ class CameraOperation():
             stConvertParam.pSrcData = cast(buf_cache, POINTER(c_ubyte))
             stConvertParam.nSrcDataLen = self.st_frame_info.nFrameLen
             stConvertParam.enSrcPixelType = self.st_frame_info.enPixelType 
+            timer = self.processor.timer
+            t_frame = time.perf_counter_ns()
 
+            bayer_pattern = BAYER8_PATTERNS.get(self.st_frame_info.enPixelType) if BAYER_FAST_PATH else None
+            mono = MONO_PIPELINE and PixelType_Gvsp_Mono8 == self.st_frame_info.enPixelType
             # RGB直接显示
             if PixelType_Gvsp_RGB8_Packed == self.st_frame_info.enPixelType:
                 numArray = CameraOperation.Color_numpy(self,buf_cache,self.st_frame_info.nWidth,self.st_frame_info.nHeight)
 
+            # 8位Bayer：直接使用原始数据，不调用SDK做全分辨率转换；检测在2x2单元合成的半分辨率图像上进行
+            elif bayer_pattern is not None:
+                numArray = np.frombuffer(buf_cache, count=self.st_frame_info.nWidth * self.st_frame_info.nHeight,
+                                         dtype=np.uint8).reshape(self.st_frame_info.nHeight, self.st_frame_info.nWidth)
+
+            # Mono8：直接在单通道原始数据上处理(灰度阈值分割)，不转换为RGB
+            elif mono:
+                numArray = np.frombuffer(buf_cache, count=self.st_frame_info.nWidth * self.st_frame_info.nHeight,
+                                         dtype=np.uint8).reshape(self.st_frame_info.nHeight, self.st_frame_info.nWidth)
+
             #如果是彩色且非RGB则转为RGB后显示
             else:
                 nConvertSize = self.st_frame_info.nWidth * self.st_frame_info.nHeight * 3
                 stConvertParam.enDstPixelType = PixelType_Gvsp_RGB8_Packed
                 stConvertParam.pDstBuffer = (c_ubyte * nConvertSize)()
                 stConvertParam.nDstBufferSize = nConvertSize
-                time_start=time.time()
+                t0 = time.perf_counter_ns()
                 ret = self.obj_cam.MV_CC_ConvertPixelType(stConvertParam)
-                time_end=time.time()
-                # print('MV_CC_ConvertPixelType:',time_end - time_start) 
+                timer.record('camera_convert', time.perf_counter_ns() - t0)
                 if ret != 0:
                     tkinter.messagebox.showerror('show error','convert pixel fail! ret = '+self.To_hex_str(ret))
                     continue
                 cdll.msvcrt.memcpy(byref(img_buff), stConvertParam.pDstBuffer, nConvertSize)
                 numArray = CameraOperation.Color_numpy(self,img_buff,self.st_frame_info.nWidth,self.st_frame_info.nHeight)
             
-            # 图像处理
-            # 将相机输出的原始RGB格式转换为OpenCV常用的BGR格式
-            bgr_image_for_processing = cv2.cvtColor(numArray, cv2.COLOR_RGB2BGR)
-            
-            try:
+            # 显示尺寸，界面尚未完成布局时使用原图尺寸
+            if panel.winfo_width() > 1 and panel.winfo_height() > 1:
+                display_size = (panel.winfo_width(), panel.winfo_height())
+            else:
+                display_size = (self.st_frame_info.nWidth, self.st_frame_info.nHeight)
+
+            # 画面变化检测：直接在相机输出的RGB图(或Bayer原始数据)上比较，静止时不做颜色转换和图像处理
+            frame_roi = self.roi_rect # 本帧使用的处理区域(PLC线程可能随时修改 self.roi_rect)
+            frame_skipped = self.frame_gate is not None and self.waiting_requests == 0 \
+                and not self.frame_gate.should_process(numArray, frame_roi)
+            if frame_skipped:
+                # 复用上一次的检测结果，只在缩小后的当前画面上重新绘制叠加图形
+                if bayer_pattern is not None:
+                    result_img = cv2.resize(self.processor.wrap_bayer(numArray, bayer_pattern).half(), display_size, interpolation=cv2.INTER_AREA)
+                elif mono:
+                    result_img = cv2.cvtColor(cv2.resize(numArray, display_size, interpolation=cv2.INTER_AREA), cv2.COLOR_GRAY2BGR)
+                else:
+                    img_small = cv2.resize(numArray, display_size, interpolation=cv2.INTER_AREA)
+                    result_img = cv2.cvtColor(img_small, cv2.COLOR_RGB2BGR)
+                scale = (display_size[0] / self.st_frame_info.nWidth, display_size[1] / self.st_frame_info.nHeight)
+                self.processor.render(result_img, self.latest_objects, self.latest_roi_rect, scale=scale)
+            else:
                 # 图像处理
-                result_img, info_for = self.processor.process(bgr_image_for_processing)
-                self.latest_info = info_for
-                # 转为RGB以在Tkinter中显示
-                display_img_rgb = cv2.cvtColor(result_img, cv2.COLOR_BGR2RGB)
-            except Exception as e:
-                print(f"图像处理时发生错误: {e}")
-                # 即使处理失败，也显示原始图像，避免UI冻结
-                display_img_rgb = cv2.cvtColor(bgr_image_for_processing, cv2.COLOR_BGR2RGB)
+                if bayer_pattern is not None:
+                    image_for_processing = self.processor.wrap_bayer(numArray, bayer_pattern)
+                elif mono:
+                    image_for_processing = numArray
+                else:
+                    # 将相机输出的原始RGB格式转换为OpenCV常用的BGR格式
+                    with timer.span('rgb2bgr'):
+                        image_for_processing = cv2.cvtColor(numArray, cv2.COLOR_RGB2BGR)
+                try:
+                    # 图像处理：检测只返回数据，叠加图形在缩放到显示尺寸后再绘制，避免在全分辨率图像上绘制
+                    if self.area_processor is not None:
+                        # 多区域：各区域并行检测，结果按区域和本帧的采集帧号写入缓存，叠加图形按区域分别绘制
+                        with timer.span('multi_area'):
+                            area_results = self.area_processor.process(image_for_processing, capture_id)
+                        objects, roi_rect = [obj for area_objects, _ in area_results for obj in area_objects], None
+                        frame_roi = None
+                    elif self.tracker is not None:
+                        # 画面从静止恢复变化时(可能有新目标进入)或PLC请求之后的第一帧做一次全图扫描
+                        objects, roi_rect = self.tracker.update(image_for_processing, roi_rect=frame_roi,
+                                                                force_full_scan=last_frame_skipped or full_scan)
+                    else:
+                        objects, roi_rect = self.processor.detect(image_for_processing, roi_rect=frame_roi)
+                    with self.frame_cond:
+                        self.frame_id = capture_id
+                        self.latest_info = self.processor.report_objects(objects, frame_id=self.frame_id)
+                        self.frame_roi = frame_roi
+                        self.frame_cond.notify_all()
+                    self.latest_objects, self.latest_roi_rect = objects, roi_rect
+                    if self.area_processor is not None:
+                        result_img = self.processor.render_for_display(image_for_processing, [], None, display_size)
+                        scale = (display_size[0] / self.st_frame_info.nWidth, display_size[1] / self.st_frame_info.nHeight)
+                        for area_objects, area_roi in area_results:
+                            self.processor.render(result_img, area_objects, area_roi, scale=scale)
+                    else:
+                        result_img = self.processor.render_for_display(image_for_processing, objects, roi_rect, display_size)
+                except Exception as e:
+                    print(f"图像处理时发生错误: {e}")
+                    if self.frame_gate is not None:
+                        self.frame_gate.reset() # 处理失败时下一帧重新处理
+                    # 即使处理失败，也显示原始图像，避免UI冻结
+                    display_src = image_for_processing.half() if bayer_pattern is not None else image_for_processing
+                    result_img = cv2.resize(display_src, display_size, interpolation=cv2.INTER_AREA)
+                    if mono:
+                        result_img = cv2.cvtColor(result_img, cv2.COLOR_GRAY2BGR)
+            last_frame_skipped = frame_skipped
+            # 转为RGB以在Tkinter中显示
+            t0 = time.perf_counter_ns()
+            display_img_rgb = cv2.cvtColor(result_img, cv2.COLOR_BGR2RGB)
             
             #合并OpenCV到Tkinter界面中
-            # 【修复】动态调整显示大小，避免图像扭曲
             current_image = Image.fromarray(display_img_rgb)
-            if panel.winfo_width() > 1 and panel.winfo_height() > 1:
-                current_image = current_image.resize((panel.winfo_width(), panel.winfo_height()), resample=Image.Resampling.LANCZOS)
-                    
             # current_image = Image.fromarray(display_img_rgb).resize((800, 800), resample=Image.Resampling.LANCZOS)
 
             imgtk = ImageTk.PhotoImage(image=current_image, master=root)
             panel.imgtk = imgtk       
             panel.config(image=imgtk) 
             root.obr = imgtk
+            t1 = time.perf_counter_ns()
+            timer.record('display', t1 - t0)
+            timer.record('frame', t1 - t_frame)
+            timer.maybe_dump() # 按 PROFILE_DUMP_INTERVAL 周期打印各阶段耗时
             nRet = self.obj_cam.MV_CC_FreeImageBuffer(stOutFrame)
             if self.b_exit == True:
                 if img_buff is not None:
@@ -324,6 +436,67 @@ class CameraOperation():
                     del buf_cache
                 break
 
+    def Enable_multi_area(self, areas):
+        """启用多区域模式: areas 为扫描区域列表 [(x, y, w, h), ...]，之后每帧并行检测全部区域"""
+        if self.area_processor is not None:
+            self.area_processor.close()
+        self.area_processor = MultiAreaProcessor(areas, timer=self.processor.timer) # 各区域的耗时随主处理器的统计一起周期打印
+
+    def Get_area_result(self, area_num, max_age=2.0, timeout=2.0):
+        """
+        多区域模式下返回区域 area_num(从1开始)需要上报的目标列表。区域1开始新的周期，等待请求之后采集的一帧处理完成；
+        同一周期内的其余区域直接使用缓存结果，缓存属于本周期之前的帧或已超过 max_age 秒时同样等待新帧。超时返回 None。
+        """
+        cache = self.area_processor.cache
+        deadline = time.monotonic() + timeout
+        with self.frame_cond:
+            if area_num == 1:
+                self.cycle_frame_id = self.capture_id + 1
+            entry = cache.get(area_num, self.cycle_frame_id, max_age)
+            if entry is not None:
+                return entry[1]
+            min_frame_id = self.capture_id + 1 # 只使用请求之后采集的帧(正在处理中的帧在请求之前采集，不使用)
+            self.waiting_requests += 1
+            try:
+                while self.frame_id < min_frame_id:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self.frame_cond.wait(remaining)
+            finally:
+                self.waiting_requests -= 1
+            entry = cache.get(area_num, min_frame_id)
+        return entry[1] if entry is not None else None
+
+    def Collect_consensus(self, min_frames=3, max_frames=5, timeout=1.5, match_distance=5.0):
+        """
+        收集当前处理区域在请求之后采集的若干帧结果并汇总(见 ConsensusCollector)，
+        连续 min_frames 帧一致、收满 max_frames 帧或超时(秒)后返回。一帧都没有收到时返回 None。
+        """
+        collector = ConsensusCollector(min_frames, max_frames, match_distance)
+        roi_rect = self.roi_rect
+        deadline = time.monotonic() + timeout
+        with self.frame_cond:
+            last_frame_id = self.frame_id
+            min_frame_id = self.capture_id + 1 # 只使用请求之后采集的帧(正在处理中的帧在请求之前采集，不使用)
+            self.full_scan_requested = True # 请求之后的第一帧做全图扫描，发现跟踪窗口之外新进入的目标
+            self.waiting_requests += 1
+            try:
+                while not collector.is_settled():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.frame_cond.wait(remaining)
+                    if self.frame_id != last_frame_id:
+                        last_frame_id = self.frame_id
+                        if self.frame_id >= min_frame_id and self.frame_roi == roi_rect:
+                            collector.add_frame(self.latest_info)
+            finally:
+                self.waiting_requests -= 1
+        if collector.frames == 0:
+            return None
+        return collector.result()
+
     def Save_jpg(self,buf_cache):
         if(None == buf_cache):
             return
@@ -0,0 +1,114 @@
+#颜色查找表模块：将 HSV 阈值预编译为 BGR -> 颜色类别 查找表
+#每帧只需一次查表即可同时得到前景掩膜和逐像素颜色标签，代替 cvtColor(HSV) + 多次 inRange/bitwise_or
+import cv2
+import numpy as np
+
+
+def color_name_from_range_key(name):
+    """阈值字典的键转为颜色名称，例如 'red1'/'red2' -> 'red'"""
+    return name.replace('1', '').replace('2', '')
+
+
+def color_names_from_ranges(hsv_ranges):
+    """按阈值字典顺序列出颜色名称(去重)，颜色标签 k>=1 对应第 k-1 个名称"""
+    color_names = []
+    for name in hsv_ranges:
+        color = color_name_from_range_key(name)
+        if color not in color_names:
+            color_names.append(color)
+    return color_names
+
+
+class ColorLUT:
+    """
+    BGR 颜色查找表。bits 为每个通道的量化位数:
+    bits=8 时为完整的 256x256x256 表(16MB，结果与逐像素 HSV 判断完全一致)，
+    bits<8 时为 (2^bits)^3 的量化表(例如 bits=5 即 32x32x32)，以量化格中心颜色的判断结果代表整个格子。
+    表中的值为颜色标签: 0 表示背景，k>=1 表示 color_names[k-1]。
+    """
+    def __init__(self, hsv_ranges, bits=8):
+        if not 1 <= bits <= 8:
+            raise ValueError(f"颜色查找表量化位数应在1-8之间，当前为 {bits}")
+        self.bits = bits
+        self.table = None
+        self.color_names = []
+        self.build_count = 0  # 查找表构建次数，用于确认只在阈值变化时重建
+        self._ranges_key = None
+        self.update(hsv_ranges)
+
+    @staticmethod
+    def _make_key(hsv_ranges):
+        return tuple((name, tuple(lo), tuple(hi)) for name, (lo, hi) in hsv_ranges.items())
+
+    def update(self, hsv_ranges):
+        """阈值发生变化时重建查找表，返回是否进行了重建。每帧调用的开销只有一次小字典比较。"""
+        key = self._make_key(hsv_ranges)
+        if key == self._ranges_key:
+            return False
+        self._build(hsv_ranges)
+        self._ranges_key = key
+        return True
+
+    def _build(self, hsv_ranges):
+        bits = self.bits
+        n = 1 << bits
+        shift = 8 - bits
+        # 索引 i 的编码: b = i 的低bits位, g = 中间bits位, r = 高bits位 (bits=8 时与 BGRA 按小端 uint32 读取一致)
+        idx = np.arange(n ** 3, dtype=np.uint32)
+        half = (1 << shift) >> 1 # 量化格的中心
+        bgr = np.empty((n ** 3, 1, 3), dtype=np.uint8)
+        for ch in range(3):
+            bgr[:, 0, ch] = (((idx >> (ch * bits)) & (n - 1)) << shift) + half
+        hsv = cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV)
+        del bgr, idx
+
+        table = np.zeros(n ** 3, dtype=np.uint8)
+        color_names = color_names_from_ranges(hsv_ranges)
+        for name, (lo, hi) in hsv_ranges.items():
+            label = color_names.index(color_name_from_range_key(name)) + 1
+            hit = cv2.inRange(hsv, np.array(lo), np.array(hi)).reshape(-1) > 0
+            # 与逐范围判断保持一致：按字典顺序，先匹配的范围优先
+            table[hit & (table == 0)] = label
+        self.table = table
+        self.color_names = color_names
+        self.build_count += 1
+
+    def lookup(self, img_bgr, labels=None, mask=None, arena=None, slot='lut'):
+        """
+        对BGR图像查表。返回 (labels, mask):
+        labels 为 uint8 逐像素颜色标签(0为背景)，mask 为 0/255 的前景掩膜。
+        可传入预分配的 labels/mask 作为输出缓冲区，arena(BufferArena) 用于复用中间缓冲区，slot 为缓冲区名称前缀。
+        """
+        h, w = img_bgr.shape[:2]
+        def buffer(name, shape, dtype, contiguous=False):
+            if arena is not None:
+                get = arena.get_contiguous if contiguous else arena.get
+                return get(f"{slot}_{name}", shape, dtype)
+            return np.empty(shape, dtype=dtype)
+        # np.take 的索引必须是C连续的 intp 数组、输出必须C连续，否则会在内部临时复制整幅数组(不经过 arena，也不计入统计)
+        if labels is None:
+            labels = buffer('labels', (h, w), np.uint8, contiguous=True)
+        idx = buffer('idx', (h, w), np.intp, contiguous=True)
+        bits = self.bits
+        if bits == 8:
+            # 补一个通道后按 uint32 读取，低24位即为 B | G<<8 | R<<16
+            bgra = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2BGRA, dst=buffer('bgra', (h, w, 4), np.uint8))
+            np.bitwise_and(bgra.view(np.uint32)[..., 0], 0xFFFFFF, out=idx)
+        else:
+            quantized = np.right_shift(img_bgr, 8 - bits, out=buffer('quantized', (h, w, 3), np.uint8))
+            tmp = buffer('idx_tmp', (h, w), np.intp)
+            np.left_shift(quantized[..., 2], 2 * bits, out=idx, dtype=np.intp)
+            np.left_shift(quantized[..., 1], bits, out=tmp, dtype=np.intp)
+            np.bitwise_or(idx, tmp, out=idx)
+            np.bitwise_or(idx, quantized[..., 0], out=idx)
+        np.take(self.table, idx, out=labels, mode='clip')
+        if mask is None:
+            mask = buffer('mask', (h, w), np.uint8)
+        mask = cv2.compare(labels, 0, cv2.CMP_GT, dst=mask)
+        return labels, mask
+
+    def color_name(self, label):
+        """颜色标签转为颜色名称，背景返回 'N/A'"""
+        if 1 <= label <= len(self.color_names):
+            return self.color_names[label - 1]
+        return 'N/A'
@@ -0,0 +1,124 @@
+#多帧一致性模块：PLC请求时汇总连续多帧的检测结果，按目标聚合后上报中位位置和圆周平均角度，剔除偶发的误检
+from collections import Counter
+import numpy as np
+from detection import DetectedObject
+
+# 各形状参考角度的对称周期(度): 正方形旋转90度后外观相同，矩形/菱形/六边形为180度，其余形状为360度
+ANGLE_SYMMETRY = {
+    'square': 90,
+    'rectangle': 180,
+    'diamond': 180,
+    'hexagon': 180,
+}
+
+
+def circular_mean_deg(angles, period=360):
+    """
+    周期为period的角度的圆周平均，结果在 [0, period) 内。
+    例如 period=90 时 1度 和 89度 的平均为 0度 而不是 45度。
+    """
+    angles = np.asarray(angles, dtype=np.float64)
+    rad = angles * (2 * np.pi / period)
+    mean = np.arctan2(np.sin(rad).mean(), np.cos(rad).mean())
+    return float((mean * period / (2 * np.pi)) % period)
+
+
+def consensus_angle(angles, shape):
+    """
+    按形状的对称周期求多帧角度的平均。平均在对称周期内进行，再平移到与多数帧原始角度最接近的等价角度，
+    使结果与单帧上报的角度处在同一取值分支(避免正方形在 0/90/180 度附近来回跳变)。圆形(角度为-1)原样返回。
+    """
+    angles = np.asarray([a for a in angles if a is not None and a >= 0], dtype=np.float64)
+    if len(angles) == 0:
+        return -1.0
+    period = ANGLE_SYMMETRY.get(shape, 360)
+    mean = circular_mean_deg(angles, period)
+    # 以原始角度的圆周中位(到其余角度的圆周距离之和最小者)作为分支参考
+    dist = np.abs((angles[:, None] - angles[None, :] + 180) % 360 - 180).sum(axis=1)
+    reference = angles[np.argmin(dist)]
+    candidates = mean + period * np.arange(360 // period)
+    best = candidates[np.argmin(np.abs((candidates - reference + 180) % 360 - 180))]
+    return float(best % 360)
+
+
+class ConsensusCollector:
+    """
+    逐帧收集上报结果(report_objects 返回的 DetectedObject 列表)，按形状和机械臂坐标距离将各帧的目标关联为同一物体。
+    连续 min_frames 帧检测到的物体集合一致时即可提前结束；最终只保留至少在 min_frames 帧中出现的物体，
+    位置取各帧的中位数，角度取按形状对称周期的圆周平均，颜色取多数。
+    """
+    def __init__(self, min_frames=3, max_frames=5, match_distance=5.0):
+        self.min_frames = min_frames          # 物体至少出现的帧数，同时也是提前结束所需的连续一致帧数
+        self.max_frames = max_frames          # 最多收集的帧数
+        self.match_distance = match_distance  # 关联时允许的最大位置偏差(机械臂坐标单位)
+        self.frames = 0
+        self._clusters = []       # 每个物体的各帧观测列表
+        self._agree_streak = 0    # 连续一致的帧数
+        self._last_members = None
+
+    def _cluster_center(self, cluster):
+        xs = [o.robot_x for o in cluster if o.robot_x is not None]
+        ys = [o.robot_y for o in cluster if o.robot_y is not None]
+        if not xs or not ys:
+            return None
+        return np.median(xs), np.median(ys)
+
+    def add_frame(self, objects):
+        """加入一帧的检测结果"""
+        self.frames += 1
+        objects = objects or []
+        members = set()
+        new_cluster = False
+        for obj in objects:
+            best, best_dist = None, self.match_distance
+            for k, cluster in enumerate(self._clusters):
+                if k in members or cluster[0].shape != obj.shape:
+                    continue
+                center = self._cluster_center(cluster)
+                if center is None or obj.robot_x is None or obj.robot_y is None:
+                    continue
+                dist = np.hypot(obj.robot_x - center[0], obj.robot_y - center[1])
+                if dist <= best_dist:
+                    best, best_dist = k, dist
+            if best is None:
+                self._clusters.append([obj])
+                best = len(self._clusters) - 1
+                new_cluster = True
+            else:
+                self._clusters[best].append(obj)
+            members.add(best)
+        # 与上一帧检测到的物体集合相同(且没有新物体)视为一致
+        if self._last_members is not None and members == self._last_members and not new_cluster:
+            self._agree_streak += 1
+        else:
+            self._agree_streak = 1
+        self._last_members = members
+
+    def is_settled(self):
+        """已连续 min_frames 帧一致，或已收集满 max_frames 帧"""
+        return self._agree_streak >= self.min_frames or self.frames >= self.max_frames
+
+    def result(self):
+        """返回汇总后的 DetectedObject 列表，frames_seen 为出现的帧数，frame_id 为最后一次观测的帧号"""
+        min_seen = min(self.min_frames, self.frames) # 帧数不足 min_frames 时(例如超时)按已收集的帧数要求
+        results = []
+        for cluster in self._clusters:
+            if len(cluster) < min_seen:
+                continue
+            shape = cluster[0].shape
+            center = self._cluster_center(cluster)
+            track_ids = [o.track_id for o in cluster if o.track_id is not None]
+            results.append(DetectedObject(
+                shape,
+                Counter(o.color for o in cluster).most_common(1)[0][0],
+                consensus_angle([o.angle_deg for o in cluster], shape),
+                center[0] if center is not None else None,
+                center[1] if center is not None else None,
+                np.median([o.pixel_x for o in cluster]),
+                np.median([o.pixel_y for o in cluster]),
+                color_confidence=np.mean([o.color_confidence for o in cluster]),
+                frame_id=cluster[-1].frame_id,
+                track_id=Counter(track_ids).most_common(1)[0][0] if track_ids else None,
+                frames_seen=len(cluster),
+            ))
+        return results
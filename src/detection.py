@@ -0,0 +1,38 @@
+#检测结果记录：从图像处理经 latest_info 一直传递到PLC格式化的紧凑结果类型
+class DetectedObject:
+    """
+    单个上报目标。使用 __slots__ 避免每个目标一个字典，字段类型固定:
+    frame_id     int          产生该结果的帧号
+    shape        str          形状名称
+    color        str          颜色名称，未识别时为 'N/A'
+    color_confidence float    颜色投票的得票占比 (0-1)
+    angle_deg    float        参考角度 0-360 度，圆形为 -1.0
+    robot_x/robot_y float     机械臂坐标，标定矩阵未加载时为 None
+    pixel_x/pixel_y float     全图像素坐标下的中心点
+    track_id     int          跟踪编号，未启用跟踪时为 None
+    frames_seen  int          多帧一致性汇总时出现的帧数，单帧结果为 1
+    """
+    __slots__ = ("frame_id", "shape", "color", "color_confidence", "angle_deg",
+                 "robot_x", "robot_y", "pixel_x", "pixel_y", "track_id", "frames_seen")
+
+    def __init__(self, shape, color, angle_deg, robot_x, robot_y, pixel_x, pixel_y,
+                 color_confidence=0.0, frame_id=0, track_id=None, frames_seen=1):
+        self.frame_id = frame_id
+        self.shape = shape
+        self.color = color
+        self.color_confidence = float(color_confidence)
+        self.angle_deg = float(angle_deg)
+        self.robot_x = float(robot_x) if robot_x is not None else None
+        self.robot_y = float(robot_y) if robot_y is not None else None
+        self.pixel_x = float(pixel_x)
+        self.pixel_y = float(pixel_y)
+        self.track_id = track_id
+        self.frames_seen = frames_seen
+
+    def to_dict(self):
+        """转为字典，用于日志和调试输出"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"DetectedObject(frame={self.frame_id}, {self.shape}, {self.color}({self.color_confidence:.2f}), "
+                f"angle={self.angle_deg:.2f}, robot=({self.robot_x}, {self.robot_y}), track={self.track_id})")
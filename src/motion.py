@@ -0,0 +1,182 @@
+#画面变化检测模块：传送带静止时跳过重复的图像处理，直接复用上一次的检测结果
+import time
+import cv2
+import numpy as np
+
+
+class FrameChangeDetector:
+    """
+    低分辨率帧差检测。将当前处理区域缩小为 thumb_width 宽的缩略图(INTER_AREA 即分块均值，可抑制传感器噪声)，
+    与上一次实际处理时的缩略图逐像素比较: 差值超过 pixel_threshold 的像素占比超过 changed_ratio 时认为画面有变化。
+    处理区域(ROI)变化、超过 refresh_interval 秒未处理或调用 reset() 后，下一帧强制处理。
+    """
+    def __init__(self, pixel_threshold=12, changed_ratio=0.002, refresh_interval=2.0, thumb_width=96):
+        self.pixel_threshold = pixel_threshold   # 缩略图像素差阈值 (0-255)
+        self.changed_ratio = changed_ratio       # 变化像素占比阈值
+        self.refresh_interval = refresh_interval # 强制刷新间隔(秒)，<=0 表示不强制刷新
+        self.thumb_width = thumb_width           # 缩略图宽度
+        self._reference = None       # 上一次处理时的缩略图
+        self._reference_roi = None
+        self._last_processed_time = 0.0
+        self._thumb = None
+        self._diff = None
+        # --- 统计计数 ---
+        self.processed_frames = 0
+        self.skipped_frames = 0
+        self.last_changed_ratio = None # 最近一次比较的变化像素占比
+
+    def reset(self):
+        """丢弃参考帧，下一帧强制处理"""
+        self._reference = None
+
+    def _thumbnail(self, img):
+        h, w = img.shape[:2]
+        thumb_w = max(1, min(self.thumb_width, w))
+        thumb_h = max(1, int(round(h * thumb_w / w)))
+        if self._thumb is None or self._thumb.shape[:2] != (thumb_h, thumb_w) or self._thumb.shape[2:] != img.shape[2:]:
+            self._thumb = np.empty((thumb_h, thumb_w) + img.shape[2:], dtype=img.dtype)
+        return cv2.resize(img, (thumb_w, thumb_h), dst=self._thumb, interpolation=cv2.INTER_AREA)
+
+    def should_process(self, img, roi_rect=None):
+        """
+        判断当前帧是否需要重新处理。img 可以是任意通道顺序的彩色图或灰度图，roi_rect=(x, y, w, h) 为处理区域。
+        返回 True 时以当前帧作为新的参考帧。
+        """
+        if roi_rect is not None:
+            x, y, w, h = roi_rect
+            img = img[max(y, 0):y+h, max(x, 0):x+w]
+        now = time.monotonic()
+        thumb = self._thumbnail(img)
+        changed = (self._reference is None or self._reference.shape != thumb.shape
+                   or roi_rect != self._reference_roi
+                   or (self.refresh_interval > 0 and now - self._last_processed_time >= self.refresh_interval))
+        if not changed:
+            self._diff = cv2.absdiff(thumb, self._reference, dst=self._diff)
+            diff = self._diff.max(axis=2) if self._diff.ndim == 3 else self._diff # 彩色图取各通道最大差值
+            self.last_changed_ratio = float(np.count_nonzero(diff > self.pixel_threshold) / diff.size)
+            changed = bool(self.last_changed_ratio > self.changed_ratio)
+        if changed:
+            self._reference = thumb.copy()
+            self._reference_roi = roi_rect
+            self._last_processed_time = now
+            self.processed_frames += 1
+        else:
+            self.skipped_frames += 1
+        return changed
+
+    def stats(self):
+        """返回统计计数字典"""
+        total = self.processed_frames + self.skipped_frames
+        return {
+            "processed_frames": self.processed_frames,
+            "skipped_frames": self.skipped_frames,
+            "skip_ratio": self.skipped_frames / total if total else 0.0,
+            "last_changed_ratio": self.last_changed_ratio,
+        }
+
+
+class DirtyTileMap:
+    """
+    分块帧差: 将图像按 tile_size 划分网格，每块取采样点的均值(INTER_AREA 整数倍缩小即分块均值)，
+    与该块上一次重新分割时的均值比较，任一通道的差值超过 threshold 的块为脏块。
+    参考均值只在块被重新分割时更新，缓慢变化累积到阈值后同样会被发现。
+    分割参数(key)变化、调用 reset() 或每隔 refresh_frames 帧时整幅标记为脏。
+    """
+    def __init__(self, tile_size=64, threshold=3.0, refresh_frames=0):
+        self.tile_size = tile_size            # 块边长(像素)
+        self.threshold = threshold            # 块均值差阈值 (0-255)
+        self.refresh_frames = refresh_frames  # 整幅刷新间隔(帧)，<=0 表示不强制刷新
+        # 块均值只在每隔 sample_step 像素的采样点上计算(每块约16x16个采样点)，远小于整幅读取的开销
+        self.sample_step = max(1, tile_size // 16)
+        while tile_size % self.sample_step:
+            self.sample_step -= 1
+        self._reference = None   # 各块上次重新分割时的均值 (rows, cols, 通道数) float32
+        self._key = None
+        self._frames_since_refresh = 0
+        self._forced = None      # 下一帧强制重新分割的块(上一帧检测到的目标所在的块)
+        # --- 统计计数 ---
+        self.frames = 0
+        self.dirty_tiles = 0     # 累计脏块数
+        self.total_tiles = 0     # 累计块数
+        self.last_dirty_ratio = None
+
+    def reset(self):
+        """丢弃参考均值，下一帧整幅重新分割"""
+        self._reference = None
+
+    def grid_shape(self, h, w):
+        return -(-h // self.tile_size), -(-w // self.tile_size)
+
+    def tile_means(self, img):
+        """各块采样点的均值 (rows, cols, 通道数)，边缘不足一块的部分单独求均值"""
+        h, w = img.shape[:2]
+        rows, cols = self.grid_shape(h, w)
+        step = self.sample_step
+        if step > 1:
+            # 最近邻缩小即按固定间隔取采样点，采样图尺寸向上取整，使其网格与原图一致
+            img = cv2.resize(img, (-(-w // step), -(-h // step)), interpolation=cv2.INTER_NEAREST)
+            h, w = img.shape[:2]
+        ts = self.tile_size // step
+        hf, wf = h // ts, w // ts # 完整块的行列数
+        channels = img.shape[2] if img.ndim == 3 else 1
+        means = np.empty((rows, cols, channels), dtype=np.float32)
+        def block_mean(region, out_w, out_h):
+            return cv2.resize(region, (out_w, out_h), interpolation=cv2.INTER_AREA).reshape(out_h, out_w, channels)
+        if hf and wf:
+            means[:hf, :wf] = block_mean(img[:hf * ts, :wf * ts], wf, hf)
+        if wf < cols and hf:
+            means[:hf, wf:] = block_mean(img[:hf * ts, wf * ts:], 1, hf)
+        if hf < rows and wf:
+            means[hf:, :wf] = block_mean(img[hf * ts:, :wf * ts], wf, 1)
+        if hf < rows and wf < cols:
+            means[hf:, wf:] = img[hf * ts:, wf * ts:].reshape(-1, channels).mean(axis=0)
+        return means
+
+    def mark_rects(self, rects, shape):
+        """将与矩形 (x, y, w, h) 重叠的块标记为下一帧强制重新分割，shape 为图像的 (h, w)"""
+        ts = self.tile_size
+        forced = np.zeros(self.grid_shape(*shape[:2]), dtype=bool)
+        for x, y, w, h in rects:
+            forced[max(y, 0) // ts:-(-(y + h) // ts), max(x, 0) // ts:-(-(x + w) // ts)] = True
+        self._forced = forced
+
+    def update(self, img, key=None, halo=0):
+        """
+        返回当前帧的脏块 (rows, cols) bool 数组，并更新脏块的参考均值。
+        halo 为分割结果受周围像素影响的半径(像素)，有变化的块按此向外扩展，使扩展后的块之外的分割结果不受变化影响。
+        """
+        means = self.tile_means(img)
+        full = (self._reference is None or self._reference.shape != means.shape or key != self._key
+                or (self.refresh_frames > 0 and self._frames_since_refresh >= self.refresh_frames))
+        if full:
+            dirty = np.ones(means.shape[:2], dtype=bool)
+            self._key = key
+            self._frames_since_refresh = 0
+        else:
+            dirty = (np.abs(means - self._reference) > self.threshold).any(axis=2)
+            radius = -(-halo // self.tile_size)
+            if radius > 0 and dirty.any():
+                kernel = np.ones((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+                dirty = cv2.dilate(dirty.view(np.uint8), kernel).astype(bool)
+            # 强制重新分割的块内容没有变化，不影响相邻块，不需要扩展
+            if self._forced is not None and self._forced.shape == dirty.shape:
+                dirty |= self._forced
+            self._frames_since_refresh += 1
+        if full:
+            self._reference = means
+        else:
+            self._reference[dirty] = means[dirty]
+        self._forced = None
+        self.frames += 1
+        self.dirty_tiles += int(np.count_nonzero(dirty))
+        self.total_tiles += dirty.size
+        self.last_dirty_ratio = float(np.count_nonzero(dirty) / dirty.size)
+        return dirty
+
+    def stats(self):
+        """返回统计计数字典，dirty_ratio 为累计的脏块占比"""
+        return {
+            "frames": self.frames,
+            "dirty_ratio": self.dirty_tiles / self.total_tiles if self.total_tiles else 0.0,
+            "last_dirty_ratio": self.last_dirty_ratio,
+        }
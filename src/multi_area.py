@@ -0,0 +1,94 @@
+#多区域模块：一帧图像同时处理全部扫描区域(A-D)，每个区域一个 Processor，在线程池中并行检测，
+#结果按区域缓存并记录帧号，PLC 依次请求各区域时直接从同一帧的缓存中取结果，每个周期只等待一次处理
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bayer import BayerFrame
+
+
+class AreaResultCache:
+    """各区域最近一次的上报结果: 区域编号(从1开始) -> (帧号, 处理完成时间, DetectedObject 列表)，线程安全"""
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, frame_id, results, timestamp=None):
+        """写入一帧中各区域的结果，results 为 {区域编号: DetectedObject 列表}"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            for area_num, info in results.items():
+                self._entries[area_num] = (frame_id, timestamp, info)
+
+    def get(self, area_num, min_frame_id=0, max_age=None):
+        """
+        返回区域的 (帧号, DetectedObject 列表)。帧号小于 min_frame_id 或结果已超过 max_age 秒时返回 None(需要等待新帧)。
+        """
+        with self._lock:
+            entry = self._entries.get(area_num)
+        if entry is None:
+            return None
+        frame_id, timestamp, info = entry
+        if frame_id < min_frame_id:
+            return None
+        if max_age is not None and time.monotonic() - timestamp > max_age:
+            return None
+        return frame_id, info
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MultiAreaProcessor:
+    """
+    在同一帧上并行检测多个扫描区域。每个区域使用自己的 Processor(缓冲区、灰度阈值等状态互不干扰)，
+    区域的ROI裁剪为原图的视图，不复制图像。OpenCV 运算期间会释放GIL，各区域可在多个核上同时进行。
+    区域内已经并行，各 Processor 不再做分条并行。
+    默认由第一个区域的 Processor 构建颜色查找表、读取标定和形状模板，其余区域共用(见 Processor 的 shared 参数)。
+    各区域的耗时统计汇总到同一个 StageTimer(timer，默认为第一个区域的)，另外按区域记录 area1..areaN 的检测耗时。
+    """
+    def __init__(self, areas, processor_factory=None, workers=None, timer=None):
+        self.areas = list(areas)   # [(x, y, w, h), ...]，下标+1 为区域编号
+        self.processors = []
+        for _ in self.areas:
+            if processor_factory is not None:
+                processor = processor_factory()
+            else:
+                from processimg import Processor
+                processor = Processor(shared=self.processors[0] if self.processors else None)
+            processor.strip_workers = 1
+            self.processors.append(processor)
+        self.timer = timer if timer is not None else (self.processors[0].timer if self.processors else None)
+        for processor in self.processors:
+            processor.timer = self.timer # StageTimer 线程安全，各区域并行记录
+        self.cache = AreaResultCache()
+        self._pool = ThreadPoolExecutor(max_workers=workers or len(self.areas) or 1, thread_name_prefix="area")
+
+    def _detect_area(self, index, img):
+        with self.timer.span(f"area{index + 1}"):
+            return self.processors[index].detect(img, roi_rect=self.areas[index])
+
+    def detect(self, img):
+        """检测所有区域，返回按区域顺序排列的 [(objects, roi_rect), ...]"""
+        if isinstance(img, BayerFrame):
+            img.half() # 先生成整帧半分辨率图像，避免多个线程同时生成
+        for processor in self.processors:
+            if processor.color_lut is not None:
+                processor.color_lut.update(processor.hsv_ranges) # 阈值变化时在主线程中重建(共用的查找表只重建一次)
+        futures = [self._pool.submit(self._detect_area, i, img) for i in range(len(self.areas))]
+        return [future.result() for future in futures]
+
+    def process(self, img, frame_id):
+        """
+        检测所有区域并按帧号写入缓存，返回 [(objects, roi_rect), ...]。
+        缓存中的结果为各区域需要上报的 DetectedObject 列表(见 Processor.report_objects)。
+        """
+        area_results = self.detect(img)
+        self.cache.put(frame_id, {
+            i + 1: processor.report_objects(objects, frame_id=frame_id)
+            for i, (processor, (objects, _)) in enumerate(zip(self.processors, area_results))
+        })
+        return area_results
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,108 @@
+#图像处理流水线的掩膜处理阶段：颜色分割之后对前景掩膜依次执行的形态学/滤波操作
+#阶段列表在 config/param.py 的 PIPELINE_STAGES 中按 (名称, 参数) 声明，可在运行时通过 Processor.set_pipeline 替换
+from abc import ABC, abstractmethod
+import cv2
+
+KERNEL_SHAPES = {
+    'ellipse': cv2.MORPH_ELLIPSE,
+    'rect': cv2.MORPH_RECT,
+    'cross': cv2.MORPH_CROSS,
+}
+
+
+def scale_ksize(ksize, scale):
+    """核尺寸按缩小倍数缩放，保持为奇数"""
+    return max(1, int(round(ksize / scale))) | 1
+
+
+class MaskStage(ABC):
+    """掩膜处理阶段基类。apply 对 uint8 掩膜执行一次操作，结果写入 dst；子类未实现抽象方法时在构建阶段即报错"""
+    def __init__(self, name, ksize):
+        self.name = name
+        self.ksize = ksize
+
+    def halo(self):
+        """分条处理时该阶段需要的重叠行数(影响范围的半径)"""
+        return self.ksize // 2
+
+    def scaled(self, scale):
+        """在缩小scale倍的图像上使用的等效阶段，核缩放到1时返回None(跳过该阶段)"""
+        ksize = scale_ksize(self.ksize, scale)
+        if ksize <= 1:
+            return None
+        return self._with_ksize(ksize)
+
+    @abstractmethod
+    def _with_ksize(self, ksize):
+        """返回核尺寸为 ksize 的同类阶段"""
+
+    @abstractmethod
+    def apply(self, mask, dst=None):
+        """对掩膜执行一次操作，返回结果(写入 dst)"""
+
+    def __repr__(self):
+        return f"{self.name}({self.ksize})"
+
+
+class MorphologyStage(MaskStage):
+    """形态学操作: open / close / erode / dilate"""
+    OPS = {
+        'open': cv2.MORPH_OPEN,
+        'close': cv2.MORPH_CLOSE,
+        'erode': cv2.MORPH_ERODE,
+        'dilate': cv2.MORPH_DILATE,
+    }
+
+    def __init__(self, name, ksize=5, shape='ellipse', iterations=1):
+        if shape not in KERNEL_SHAPES:
+            raise ValueError(f"未知的结构元素形状: {shape}，可选 {list(KERNEL_SHAPES)}")
+        super().__init__(name, ksize)
+        self.shape = shape
+        self.iterations = iterations
+        self.op = self.OPS[name]
+        self.kernel = cv2.getStructuringElement(KERNEL_SHAPES[shape], (ksize, ksize))
+
+    def halo(self):
+        # 开/闭运算为腐蚀+膨胀两步，影响半径加倍
+        steps = 2 if self.op in (cv2.MORPH_OPEN, cv2.MORPH_CLOSE) else 1
+        return steps * self.iterations * (self.ksize // 2)
+
+    def _with_ksize(self, ksize):
+        return MorphologyStage(self.name, ksize, self.shape, self.iterations)
+
+    def apply(self, mask, dst=None):
+        return cv2.morphologyEx(mask, self.op, self.kernel, iterations=self.iterations, dst=dst)
+
+    def __repr__(self):
+        return f"{self.name}({self.ksize}, {self.shape})"
+
+
+class MedianStage(MaskStage):
+    """中值滤波"""
+    def __init__(self, name='median', ksize=5):
+        super().__init__(name, ksize)
+
+    def _with_ksize(self, ksize):
+        return MedianStage(self.name, ksize)
+
+    def apply(self, mask, dst=None):
+        return cv2.medianBlur(mask, self.ksize, dst=dst)
+
+
+STAGE_TYPES = {
+    'open': MorphologyStage,
+    'close': MorphologyStage,
+    'erode': MorphologyStage,
+    'dilate': MorphologyStage,
+    'median': MedianStage,
+}
+
+
+def build_mask_stages(stage_specs):
+    """由 [(名称, 参数字典), ...] 构建阶段列表"""
+    stages = []
+    for name, params in stage_specs:
+        if name not in STAGE_TYPES:
+            raise ValueError(f"未知的流水线阶段: {name}，可选 {list(STAGE_TYPES)}")
+        stages.append(STAGE_TYPES[name](name, **(params or {})))
+    return stages
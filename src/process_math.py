@@ -14,111 +14,230 @@ def get_vector_angle_0_360(p_start, p_end):
     return (angle_deg_raw + 360) % 360
 def get_sides_sorted_by_length(approx_points):
     """获取逼近轮廓的各条边（顶点对）及其长度，按长度降序排序"""
-    sides_info = [] 
     num_points = len(approx_points)
     if num_points < 2: return []
-    for i in range(num_points):
-        p1 = approx_points[i][0] 
-        p2 = approx_points[(i + 1) % num_points][0]
-        length = np.linalg.norm(p1 - p2)
-        sides_info.append(((p1, p2), length))
+    pts = np.asarray(approx_points).reshape(-1, 2)
+    lengths = batch_side_lengths(pts[None])[0]
+    sides_info = [((approx_points[i][0], approx_points[(i + 1) % num_points][0]), lengths[i]) for i in range(num_points)]
     sides_info.sort(key=lambda x: x[1], reverse=True) 
     return sides_info 
 def find_trapezoid_bases(approx_points_reshaped):
     """为梯形找到两条平行底边，并区分长短。"""
     if len(approx_points_reshaped) != 4: return None, None
-    vecs = [approx_points_reshaped[(i + 1) % 4] - approx_points_reshaped[i] for i in range(4)]
-    angles_deg = [np.degrees(np.arctan2(v[1], v[0])) if np.linalg.norm(v) > 1e-6 else 0 for v in vecs]
-    parallel_pairs_indices = []
-    diff_02 = abs(angles_deg[0] - angles_deg[2])
-    if min(diff_02, abs(diff_02 - 180), abs(diff_02 + 180)) < 15: parallel_pairs_indices.append((0, 2))
-    diff_13 = abs(angles_deg[1] - angles_deg[3])
-    if min(diff_13, abs(diff_13 - 180), abs(diff_13 + 180)) < 15: parallel_pairs_indices.append((1, 3))
-    if len(parallel_pairs_indices) != 1: return None, None
-    idx1, idx2 = parallel_pairs_indices[0]
-    
-    base1_p1, base1_p2 = approx_points_reshaped[idx1], approx_points_reshaped[(idx1 + 1) % 4]
-    base1_len = np.linalg.norm(base1_p1 - base1_p2)
-    base2_p1, base2_p2 = approx_points_reshaped[idx2], approx_points_reshaped[(idx2 + 1) % 4]
-    base2_len = np.linalg.norm(base2_p1 - base2_p2)
-    if base1_len >= base2_len: return ((base1_p1, base1_p2), (base2_p1, base2_p2))
-    else: return ((base2_p1, base2_p2), (base1_p1, base1_p2))
+    pts = approx_points_reshaped
+    valid, long_idx, short_idx, _, _ = batch_trapezoid_bases(np.asarray(pts)[None])
+    if not valid[0]: return None, None
+    i, j = int(long_idx[0]), int(short_idx[0])
+    return ((pts[i], pts[(i + 1) % 4]), (pts[j], pts[(j + 1) % 4]))
 def is_trapezoid(approx): # approx 是 (N,1,2) 形状
-    # 用户原始的 _is_trapezoid 判断逻辑
+    # 用户原始的 _is_trapezoid 判断逻辑，见 batch_is_trapezoid
     if len(approx) != 4:
         return False
-    pts = approx.reshape(4,2)
-    vecs = [pts[(i+1)%4]-pts[i] for i in range(4)]
-    def is_parallel_local(v1, v2): # 局部函数，保持与用户定义一致
-        # 确保v1, v2是numpy array
-        v1_np = np.array(v1)
-        v2_np = np.array(v2)
-        if np.linalg.norm(v1_np) < 1e-6 or np.linalg.norm(v2_np) < 1e-6: return False # 避免零向量
-        ang = abs(np.degrees(np.arctan2(v1_np[1],v1_np[0]) - np.arctan2(v2_np[1],v2_np[0])))
-        # 归一化角度差到 [0, 180]
-        while ang > 180: ang -= 360
-        ang = abs(ang)
-        if ang > 90: ang = 180 - ang # 取最小夹角
-        return ang < 10 # 平行容差为10度 (与0度或180度线的夹角小于10度)
-    parallels = 0
-    # 检查 vec[0]与vec[2] (对边1), vec[1]与vec[3] (对边2)
-    if is_parallel_local(vecs[0], vecs[2]): parallels += 1
-    if is_parallel_local(vecs[1], vecs[3]): parallels += 1
-    return parallels == 1 # 梯形：有且仅有一组对边平行
+    return bool(batch_is_trapezoid(approx.reshape(1, 4, 2))[0]) # 梯形：有且仅有一组对边平行
 
 def find_hexagon_parallel_side_pair(approx_points_reshaped):
     """为六边形找到一对平行边。approx_points_reshaped: 6x2 的顶点数组"""
     if len(approx_points_reshaped) != 6:
         return None
-    vecs = [approx_points_reshaped[(i + 1) % 6] - approx_points_reshaped[i] for i in range(6)]
-    angles_deg = [np.degrees(np.arctan2(v[1], v[0])) if np.linalg.norm(v) > 1e-6 else 0 for v in vecs]
-    # 正六边形有三对平行边：(v0, v3), (v1, v4), (v2, v5)
-    parallel_check_tolerance = 15 # 平行判断的角度容差
-    
-    # 检查第一对: 边0 (v0-v1) 与 边3 (v3-v4)
-    diff_03 = abs(angles_deg[0] - angles_deg[3])
-    if min(diff_03, abs(diff_03 - 180), abs(diff_03 + 180)) < parallel_check_tolerance:
-        p1_pair1 = approx_points_reshaped[0]
-        p2_pair1 = approx_points_reshaped[1]
-        p1_pair2 = approx_points_reshaped[3]
-        p2_pair2 = approx_points_reshaped[4]
-        return ((p1_pair1, p2_pair1), (p1_pair2, p2_pair2))
-    # 检查第二对: 边1 (v1-v2) 与 边4 (v4-v5)
-    diff_14 = abs(angles_deg[1] - angles_deg[4])
-    if min(diff_14, abs(diff_14 - 180), abs(diff_14 + 180)) < parallel_check_tolerance:
-        p1_pair1 = approx_points_reshaped[1]
-        p2_pair1 = approx_points_reshaped[2]
-        p1_pair2 = approx_points_reshaped[4]
-        p2_pair2 = approx_points_reshaped[5]
-        return ((p1_pair1, p2_pair1), (p1_pair2, p2_pair2))
-    # 检查第三对: 边2 (v2-v3) 与 边5 (v5-v0)
-    diff_25 = abs(angles_deg[2] - angles_deg[5])
-    if min(diff_25, abs(diff_25 - 180), abs(diff_25 + 180)) < parallel_check_tolerance:
-        p1_pair1 = approx_points_reshaped[2]
-        p2_pair1 = approx_points_reshaped[3]
-        p1_pair2 = approx_points_reshaped[5]
-        p2_pair2 = approx_points_reshaped[0]
-        return ((p1_pair1, p2_pair1), (p1_pair2, p2_pair2))
-        
-    return None # 未找到平行对
+    pts = approx_points_reshaped
+    valid, side_idx, _, _ = batch_hexagon_parallel_pair(np.asarray(pts)[None])
+    if not valid[0]:
+        return None # 未找到平行对
+    i = int(side_idx[0])
+    return ((pts[i], pts[(i + 1) % 6]), (pts[i + 3], pts[(i + 4) % 6]))
 def calculate_interior_angles(approx_points_reshaped):
     """计算多边形所有内角"""
-    angles = []
     n = len(approx_points_reshaped)
     if n < 3: return []
-    for i in range(n):
-        p_prev = approx_points_reshaped[(i - 1 + n) % n]
-        p_curr = approx_points_reshaped[i]
-        p_next = approx_points_reshaped[(i + 1) % n]
-        v1 = p_prev - p_curr 
-        v2 = p_next - p_curr 
-        dot_product = np.dot(v1, v2)
-        mag_v1 = np.linalg.norm(v1)
-        mag_v2 = np.linalg.norm(v2)
-        if mag_v1 * mag_v2 < 1e-6: 
-            angles.append(0) 
-            continue
-        cos_angle = np.clip(dot_product / (mag_v1 * mag_v2), -1.0, 1.0)
-        angle = np.degrees(np.arccos(cos_angle))
-        angles.append(angle)
-    return angles
\ No newline at end of file
+    return batch_interior_angles(np.asarray(approx_points_reshaped)[None])[0].tolist()
+
+# ==================== 批量几何计算 ====================
+# 以下函数一次处理同一帧中所有顶点数相同的多边形，输入为 (N, k, 2) 数组，
+# 避免逐个多边形、逐条边调用 np.linalg.norm/arctan2 带来的 Python 开销。
+# 上面的单个多边形函数均为这些批量函数的薄封装，行为保持不变。
+
+def _edge_vectors(polys):
+    """(N, k, 2) 多边形的边向量，第i条边为 顶点i -> 顶点i+1"""
+    polys = np.asarray(polys, dtype=np.float64)
+    return np.roll(polys, -1, axis=1) - polys
+
+def batch_side_lengths(polys):
+    """返回 (N, k) 边长，第i条边为 顶点i -> 顶点i+1"""
+    return np.linalg.norm(_edge_vectors(polys), axis=2)
+
+def batch_interior_angles(polys):
+    """返回 (N, k) 内角(度)，第i个为顶点i处的内角；相邻边长度为0时记为0"""
+    polys = np.asarray(polys, dtype=np.float64)
+    v1 = np.roll(polys, 1, axis=1) - polys # 指向前一个顶点
+    v2 = np.roll(polys, -1, axis=1) - polys # 指向后一个顶点
+    dot_product = np.einsum('nkj,nkj->nk', v1, v2)
+    mag = np.linalg.norm(v1, axis=2) * np.linalg.norm(v2, axis=2)
+    degenerate = mag < 1e-6
+    cos_angle = np.clip(dot_product / np.where(degenerate, 1.0, mag), -1.0, 1.0)
+    return np.where(degenerate, 0.0, np.degrees(np.arccos(cos_angle)))
+
+def batch_edge_angles(polys):
+    """返回 (N, k) 各条边与x轴正方向的夹角(度，-180~180)，零长度边记为0"""
+    vecs = _edge_vectors(polys)
+    angles = np.degrees(np.arctan2(vecs[..., 1], vecs[..., 0]))
+    return np.where(np.linalg.norm(vecs, axis=2) > 1e-6, angles, 0.0)
+
+def batch_parallel_mask(edge_angles, pairs, tolerance=15):
+    """
+    判断给定的边对是否平行。edge_angles 为 batch_edge_angles 的结果，pairs 为 [(i, j), ...]。
+    返回 (N, len(pairs)) 布尔数组，判断规则与 find_trapezoid_bases 一致: 角度差与0/180度的最小差值小于容差。
+    """
+    idx_i = np.array([i for i, _ in pairs])
+    idx_j = np.array([j for _, j in pairs])
+    diff = np.abs(edge_angles[:, idx_i] - edge_angles[:, idx_j])
+    return np.minimum(np.minimum(diff, np.abs(diff - 180)), np.abs(diff + 180)) < tolerance
+
+def batch_midpoints(p1, p2):
+    """(..., 2) 两点的中点，与 get_midpoint 相同地截断为整数"""
+    return np.trunc((np.asarray(p1, dtype=np.float64) + np.asarray(p2, dtype=np.float64)) / 2).astype(int)
+
+def batch_vector_angles_0_360(p_start, p_end):
+    """(N, 2) 向量 p_start -> p_end 与x轴正方向的0-360度角"""
+    vec = np.asarray(p_end, dtype=np.float64) - np.asarray(p_start, dtype=np.float64)
+    return (np.degrees(np.arctan2(vec[..., 1], vec[..., 0])) + 360) % 360
+
+def batch_is_trapezoid(polys):
+    """(N, 4, 2) 四边形是否为梯形：有且仅有一组对边平行(容差10度)，返回 (N,) 布尔数组"""
+    vecs = _edge_vectors(polys)
+    norms = np.linalg.norm(vecs, axis=2)
+    raw = np.arctan2(vecs[..., 1], vecs[..., 0])
+    def parallel(i, j):
+        ang = np.abs(np.degrees(raw[:, i] - raw[:, j]))
+        ang = np.where(ang > 180, 360 - ang, ang) # 归一化角度差到 [0, 180]
+        ang = np.where(ang > 90, 180 - ang, ang)  # 取最小夹角
+        return (ang < 10) & (norms[:, i] >= 1e-6) & (norms[:, j] >= 1e-6) # 避免零向量
+    parallels = parallel(0, 2).astype(int) + parallel(1, 3).astype(int)
+    return parallels == 1
+
+def batch_trapezoid_bases(polys):
+    """
+    (N, 4, 2) 四边形的两条平行底边(容差15度)，有且仅有一组对边平行时有效。
+    返回 (valid, long_idx, short_idx, long_mid, short_mid):
+    valid (N,) 布尔; long_idx/short_idx (N,) 长/短底边的边序号(边i为顶点i->i+1); long_mid/short_mid (N, 2) 底边中点。
+    """
+    polys = np.asarray(polys)
+    lengths = batch_side_lengths(polys)
+    parallel = batch_parallel_mask(batch_edge_angles(polys), [(0, 2), (1, 3)])
+    valid = parallel.sum(axis=1) == 1
+    idx1 = np.where(parallel[:, 0], 0, 1)
+    idx2 = idx1 + 2
+    rows = np.arange(len(polys))
+    base1_longer = lengths[rows, idx1] >= lengths[rows, idx2]
+    long_idx = np.where(base1_longer, idx1, idx2)
+    short_idx = np.where(base1_longer, idx2, idx1)
+    long_mid = batch_midpoints(polys[rows, long_idx], polys[rows, (long_idx + 1) % 4])
+    short_mid = batch_midpoints(polys[rows, short_idx], polys[rows, (short_idx + 1) % 4])
+    return valid, long_idx, short_idx, long_mid, short_mid
+
+def batch_hexagon_parallel_pair(polys):
+    """
+    (N, 6, 2) 六边形中第一组平行的对边(边0/3、1/4、2/5，容差15度)。
+    返回 (valid, side_idx, mid1, mid2): side_idx 为第一条边的序号(另一条为 side_idx+3)，mid1/mid2 为两条边的中点。
+    """
+    polys = np.asarray(polys)
+    parallel = batch_parallel_mask(batch_edge_angles(polys), [(0, 3), (1, 4), (2, 5)])
+    valid = parallel.any(axis=1)
+    side_idx = np.argmax(parallel, axis=1)
+    rows = np.arange(len(polys))
+    mid1 = batch_midpoints(polys[rows, side_idx], polys[rows, (side_idx + 1) % 6])
+    mid2 = batch_midpoints(polys[rows, side_idx + 3], polys[rows, (side_idx + 4) % 6])
+    return valid, side_idx, mid1, mid2
+
+def batch_classify_quadrilaterals(polys, angle_tolerance=15, side_relative_tolerance=0.15):
+    """
+    (N, 4, 2) 四边形分类，返回 (N,) 形状名称数组: square / diamond / rectangle / trapezoid / unknown。
+    规则与逐个判断时相同: 四边等长且四角约90度为正方形，四边等长为菱形，对边等长且四角约90度为矩形，否则判断梯形。
+    """
+    polys = np.asarray(polys)
+    labels = np.full(len(polys), 'unknown', dtype=object)
+    if len(polys) == 0:
+        return labels
+    side_lengths = batch_side_lengths(polys)
+    interior_angles = batch_interior_angles(polys)
+    all_angles_approx_90 = np.all(np.abs(interior_angles - 90) < angle_tolerance, axis=1)
+    max_side = side_lengths.max(axis=1)
+    all_sides_approx_equal = (max_side - side_lengths.min(axis=1)) < side_relative_tolerance * (max_side + 1e-6)
+    s0, s1, s2, s3 = side_lengths.T
+    opposite_sides_approx_equal = (np.abs(s0 - s2) < side_relative_tolerance * np.maximum(np.maximum(s0, s2), 1e-6)) \
+        & (np.abs(s1 - s3) < side_relative_tolerance * np.maximum(np.maximum(s1, s3), 1e-6))
+    trapezoid = batch_is_trapezoid(polys)
+    labels[trapezoid] = 'trapezoid'
+    labels[opposite_sides_approx_equal & all_angles_approx_90] = 'rectangle'
+    labels[all_sides_approx_equal] = 'diamond'
+    labels[all_sides_approx_equal & all_angles_approx_90] = 'square'
+    return labels
+
+def batch_order_top_first(p1, p2):
+    """(N, 2) 两组点按 y 较小(相同时 x 较小)者在前排序，返回 (起点, 终点)，用于统一参考向量方向"""
+    p1, p2 = np.asarray(p1), np.asarray(p2)
+    first = (p1[:, 1] < p2[:, 1]) | ((p1[:, 1] == p2[:, 1]) & (p1[:, 0] < p2[:, 0]))
+    first = first[:, None]
+    return np.where(first, p1, p2), np.where(first, p2, p1)
+
+def batch_triangle_reference(polys, centers):
+    """
+    (N, 3, 2) 三角形的参考向量: 起点为远边(另外两个顶点)的中点，终点为离中心最近的顶点。
+    centers 为 (N, 2) 中心点，返回 (起点, 终点) 两个 (N, 2) 数组。
+    """
+    polys = np.asarray(polys)
+    distances = np.linalg.norm(polys - np.asarray(centers, dtype=np.float64)[:, None, :], axis=2)
+    closest = np.argmin(distances, axis=1)
+    rows = np.arange(len(polys))
+    return batch_midpoints(polys[rows, (closest + 1) % 3], polys[rows, (closest + 2) % 3]), polys[rows, closest]
+
+def batch_axis_orientation(mu20, mu02, mu11):
+    """
+    (N,) 二阶中心矩求主轴方向，返回 [0, 180) 度(图像坐标，y向下)。
+    用于矩形/菱形等180度对称的形状；正方形的二阶矩各向同性，主轴方向不确定。
+    """
+    mu20, mu02, mu11 = (np.asarray(m, dtype=np.float64) for m in (mu20, mu02, mu11))
+    return np.degrees(0.5 * np.arctan2(2 * mu11, mu20 - mu02)) % 180
+
+def batch_fourfold_orientation(polys):
+    """
+    边界的4次谐波求方向: 对每个闭合多边形(如凸包)的各条边按边长加权累加 exp(4i*边方向)，
+    辐角/4 即为边方向(也是边法线方向)在90度周期内的取值，返回 [0, 90) 度。
+    polys 为长度 N 的列表，每项为 (Ni, 2) 顶点数组；所有多边形拼接后一次计算。
+    """
+    if len(polys) == 0:
+        return np.zeros(0)
+    counts = np.array([len(p) for p in polys])
+    pts = np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in polys])
+    owner = np.repeat(np.arange(len(polys)), counts)
+    # 每个顶点的下一个顶点，各多边形的最后一个顶点接回第一个
+    nxt = np.arange(len(pts)) + 1
+    ends = np.cumsum(counts)
+    nxt[ends - 1] = ends - counts
+    vec = pts[nxt] - pts
+    length = np.hypot(vec[:, 0], vec[:, 1])
+    phase = 4 * np.arctan2(vec[:, 1], vec[:, 0])
+    re = np.bincount(owner, weights=length * np.cos(phase), minlength=len(polys))
+    im = np.bincount(owner, weights=length * np.sin(phase), minlength=len(polys))
+    return np.degrees(np.arctan2(im, re) / 4) % 90
+
+def batch_axis_reference(centers, angles_deg, lengths):
+    """
+    以 centers (N, 2) 为中点、方向为 angles_deg (N,)、长度为 lengths (N,) 的参考向量，返回 (起点, 终点)。
+    角度在 [0, 180) 内时终点的y不小于起点，与 batch_order_top_first 的方向约定一致。
+    """
+    rad = np.radians(np.asarray(angles_deg, dtype=np.float64))
+    half = 0.5 * np.asarray(lengths, dtype=np.float64)[:, None] * np.stack([np.cos(rad), np.sin(rad)], axis=1)
+    centers = np.asarray(centers, dtype=np.float64)
+    return centers - half, centers + half
+
+def otsu_threshold(hist):
+    """由256级灰度直方图求 Otsu 阈值(使类间方差最大的灰度级)，前景为大于阈值的像素"""
+    hist = np.asarray(hist, dtype=np.float64).reshape(-1)
+    levels = np.arange(len(hist))
+    w0 = np.cumsum(hist)                 # 灰度 <= t 的像素数
+    w1 = w0[-1] - w0
+    sum0 = np.cumsum(hist * levels)
+    mean0 = sum0 / np.maximum(w0, 1)
+    mean1 = (sum0[-1] - sum0) / np.maximum(w1, 1)
+    between = w0 * w1 * (mean0 - mean1) ** 2
+    return int(np.argmax(between))
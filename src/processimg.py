@@ -4,26 +4,103 @@ import numpy as np
 import time
 import sys
 import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入路径设置 - 相对于项目根目录
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, os.path.join(_project_root, "config"))
 
 from process_math import *
-from param import PLC_SERVER_HOST, PLC_SERVER_PORT, CALIBRATION_FILE_PATH, SCAN_AREA_FILES
+from color_lut import ColorLUT, color_name_from_range_key, color_names_from_ranges
+from buffer_arena import BufferArena
+from detection import DetectedObject
+from pipeline import build_mask_stages
+from profiler import StageTimer
+from motion import DirtyTileMap
+from calibration import CalibrationModel, load_intrinsics
+from bayer import BayerFrame, bgr_to_bayer
+from shape_templates import ShapeTemplateLibrary
+from param import PLC_SERVER_HOST, PLC_SERVER_PORT, CALIBRATION_FILE_PATH, SCAN_AREA_FILES, CAMERA_INTRINSICS_FILE_PATH
 
 class Processor:
-    def __init__(self):
+    def __init__(self, shared=None):
+        # shared: 另一个 Processor，其只读的颜色查找表、标定模型和形状模板库直接共用，不再重新构建/读取
+        #         (多区域并行时每个区域一个 Processor，缓冲区、灰度阈值等逐帧状态仍各自独立)
         # 定义几种常见颜色在 HSV 空间的阈值范围（示例）
-        from param import hsv_range
+        from param import hsv_range, COLOR_SEGMENT_MODE, COLOR_LUT_BITS, PYRAMID_LEVEL, STRIP_WORKERS, REPORT_SHAPES, DEBUG_ALL_SHAPES, PIPELINE_STAGES, ORIENTATION_METHOD
+        from param import MONO_THRESHOLD, MONO_POLARITY
+        from param import SHAPE_CLASSIFIER, SHAPE_TEMPLATE_DIR, SHAPE_TEMPLATE_MAX_DISTANCE
+        from param import PROFILING_ENABLED, PROFILE_WINDOW, PROFILE_DUMP_INTERVAL
+        from param import DIRTY_TILE_SIZE, DIRTY_TILE_THRESHOLD, DIRTY_TILE_REFRESH_FRAMES, DIRTY_TILE_MONO_TOLERANCE
         self.hsv_ranges = hsv_range
-        # --- 形态学操作的结构元素 ---
-        self.kernel_open = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        self.kernel_close = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (9, 9))
+        # 颜色分割方式: 'lut' 使用预编译的BGR查找表，'hsv' 使用逐帧HSV转换+inRange
+        self.color_segment_mode = COLOR_SEGMENT_MODE
+        if shared is not None:
+            self.color_lut = shared.color_lut
+        else:
+            self.color_lut = ColorLUT(self.hsv_ranges, bits=COLOR_LUT_BITS) if self.color_segment_mode == 'lut' else None
+        # --- 单通道(黑白)图像: 灰度阈值分割，颜色上报为 'unknown' ---
+        self.mono_threshold = MONO_THRESHOLD  # 固定阈值 (1-255)，0 表示每帧按 Otsu 自动计算
+        self.mono_polarity = MONO_POLARITY    # 'bright': 目标比背景亮；'dark': 目标比背景暗
+        self._mono_level = 127                # 当前帧使用的阈值
+        # --- 颜色分割之后的掩膜处理阶段(形态学平滑等)，见 pipeline.py ---
+        self.mask_stages = []
+        self._scaled_stages = {}    # 按缩放倍数缓存的等效阶段列表
+        self.set_pipeline(PIPELINE_STAGES)
         # 最小检测面积 
         self.min_area = 50000
+        # 扫描区域分割时向外扩展的像素数，应不小于最大工件的尺寸：跨ROI边界的工件整体参与分割，
+        # 轮廓、中心和角度与整幅分割一致，再按中心是否在ROI内过滤
+        self.roi_padding = 640
+        self._warned_rois = set() # 已提示过不在图像范围内的ROI
         # 轮廓逼近精度
         self.eps_factor = 0.02
+        # 中心和角度的计算方式: 'moments' 中心取轮廓质心，正方形/矩形/菱形的角度由轮廓矩(亚像素)计算；
+        # 'vertex' 中心取最小外接矩形中心，角度由逼近多边形的顶点(对边中点连线)计算
+        self.orientation_method = ORIENTATION_METHOD
+        # --- 连通域统计预过滤: 在轮廓分析之前按外接矩形长宽比和面积占比剔除干扰 (灰尘、反光、传送带边缘等) ---
+        self.max_blob_aspect = 7        # 外接矩形长宽比上限
+        self.max_blob_area_ratio = 0.7  # 单个连通域面积占处理区域面积的上限
+        # --- 金字塔(由粗到精)检测: 0 为全分辨率，1/2 表示在 2x/4x 降采样图上分割和找轮廓，
+        #     再在每个目标周围的小窗口内以全分辨率精化轮廓 ---
+        self.pyramid_level = PYRAMID_LEVEL
+        self.refine_margin = 16     # 精化窗口相对粗轮廓外接矩形的外扩像素(全分辨率)
+        # --- 分条并行: 将图像按行分成若干条带(带重叠边)，在线程池中并行分割，OpenCV运算期间会释放GIL ---
+        self.strip_workers = STRIP_WORKERS  # 工作线程数，<=1 表示单线程整幅处理
+        self._strip_pool = None
+        self._strip_pool_size = 0
+        # --- 分块更新: 只重新分割与上一帧相比有变化的块和上一帧目标所在的块，其余块沿用常驻掩膜中的结果 ---
+        self.tile_size = DIRTY_TILE_SIZE                    # 块边长(全分辨率像素)，<=0 表示每帧整幅分割
+        self.tile_threshold = DIRTY_TILE_THRESHOLD          # 块均值差阈值 (0-255)
+        self.tile_refresh_frames = DIRTY_TILE_REFRESH_FRAMES # 整幅重新分割的间隔(帧)
+        self.tile_mono_tolerance = DIRTY_TILE_MONO_TOLERANCE # Otsu 灰度阈值在该范围内波动时沿用上次的阈值
+        # (slot, 分割区域起点, 图像形状) -> [DirtyTileMap, 常驻掩膜, 常驻颜色标签图, 沿用的灰度阈值]，按使用顺序排列。
+        # 只有扫描区域(及全图)使用分块更新，跟踪窗口和精化窗口每次直接分割，不会占用或挤掉这里的状态
+        self._tile_states = {}
+        # 按帧尺寸复用的输出缓冲区，稳态处理时不再分配整帧大小的数组
+        self.arena = BufferArena()
+        # 各阶段耗时的滚动统计 (segment/mask/morphology/contours/analysis/render 等)，相机线程也记录在这里
+        self.timer = StageTimer(PROFILE_WINDOW, PROFILING_ENABLED, PROFILE_DUMP_INTERVAL)
+        # 需要上报给PLC的形状，只有可能成为这些形状的轮廓才做凸包逼近、角度和颜色计算
+        self.reported_shapes = tuple(REPORT_SHAPES)
+        # 调试: 对所有形状做完整分析并绘制 (否则不上报的形状只计数)
+        self.debug_all_shapes = DEBUG_ALL_SHAPES
+        # --- 形状快速预判: 基于最小外接矩形的 (长宽比上限, 填充率下限)，填充率 = 轮廓面积 / 外接矩形面积 ---
+        #     阈值取得较宽松，只剔除不可能成为该形状的轮廓；表中没有的形状不做预判
+        self.shape_gates = {
+            'circle': (4.2, 0.55),  # 圆度>0.75 的凸形长宽比不超过 pi/0.75；三角形填充率约0.5
+            'square': (1.5, 0.55),
+        }
+        # --- 形状判断方式: 'rules' 按逼近多边形的顶点数和边角规则判断；'radial' / 'hu' 与模板库中的参考形状比较，
+        #     模板库在启动时从 SHAPE_TEMPLATE_DIR 的参考图像加载一次 ---
+        self.shape_library = None
+        if shared is not None:
+            self.shape_library = shared.shape_library
+        elif SHAPE_CLASSIFIER != 'rules':
+            self.shape_library = ShapeTemplateLibrary(SHAPE_CLASSIFIER, SHAPE_TEMPLATE_MAX_DISTANCE)
+            self.shape_library.load_directory(SHAPE_TEMPLATE_DIR)
+        self.shape_counts = Counter() # 最近一帧中未做完整分析的轮廓数，按形状计数('gated' 为预判剔除)
         # --- 用于控制绘制效果的参数 ---
         self.font_scale = 1.5       # 字体缩放比例
         self.text_thickness = 3     # 文本线条粗细
@@ -33,9 +110,22 @@ class Processor:
 
         # --- 新增：从文件加载仿射变换矩阵 ---
         self.affine_transform_matrix = None # 初始化为None
+        # 相机内参和畸变系数只在启动时读取一次，与标定矩阵一起组成 self.calibration
+        if shared is not None:
+            self.affine_transform_matrix = shared.affine_transform_matrix
+            self.camera_matrix, self.dist_coeffs = shared.camera_matrix, shared.dist_coeffs
+            self.calibration = shared.calibration
+            return
+        self.camera_matrix, self.dist_coeffs = load_intrinsics(CAMERA_INTRINSICS_FILE_PATH)
+        self.calibration = None
         self._load_affine_matrix(CALIBRATION_FILE_PATH) # 调用加载方法
     
     def _load_affine_matrix(self, filepath):
+        """读取标定矩阵并重建 self.calibration (坐标转换使用的标定模型)"""
+        self._read_affine_matrix(filepath)
+        self.calibration = CalibrationModel(self.affine_transform_matrix, self.camera_matrix, self.dist_coeffs)
+
+    def _read_affine_matrix(self, filepath):
         if not os.path.exists(filepath):
             print(f"错误：标定文件 '{filepath}' 未找到！")
             self.affine_transform_matrix = np.eye(3, dtype=np.float32)
@@ -49,48 +139,546 @@ class Processor:
             print(f"加载标定文件 '{filepath}' 时发生错误: {e}")
             self.affine_transform_matrix = np.eye(3, dtype=np.float32)
 
-    def process(self, original_img, roi_rect=None):
-        img_display = original_img.copy()# 用于绘制结果的图像
-       # --- 【核心修改】应用ROI遮罩 ---
-        roi_rect = [350, 200, 2000, 1500]
+    def wrap_bayer(self, raw, pattern='RGGB'):
+        """将 (H, W) 8位Bayer原始数据包装为 BayerFrame(可直接传给 detect)，半分辨率图像写入复用缓冲区"""
+        h, w = raw.shape[:2]
+        self.arena.begin_frame((h, w, 3))
+        return BayerFrame(raw, pattern, half_out=self.arena.get("bayer_half", (h // 2, w // 2, 3)))
+
+    def _clip_roi(self, roi_rect, w_img, h_img):
+        """
+        将ROI (x, y, w, h) 裁剪到图像范围内。roi_rect 为None时返回None(即使用全图)；
+        ROI为空或完全在图像外时返回宽高为0的ROI(没有检测结果)，而不是退回全图处理，避免把其他区域的目标上报给PLC。
+        """
+        if roi_rect is None:
+            return None
+        x, y, w, h = [int(v) for v in roi_rect]
+        x0, y0 = min(max(x, 0), w_img), min(max(y, 0), h_img)
+        x1, y1 = min(x + w, w_img), min(y + h, h_img)
+        if x1 <= x0 or y1 <= y0:
+            key = (tuple(roi_rect), w_img, h_img)
+            if key not in self._warned_rois: # 每个ROI只提示一次，不在每帧重复输出
+                self._warned_rois.add(key)
+                print(f"警告：ROI {roi_rect} 不在图像范围 {w_img}x{h_img} 内，该区域不做检测，请检查扫描区域配置。")
+            return (x0, y0, 0, 0)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def set_pipeline(self, stage_specs):
+        """替换掩膜处理阶段，stage_specs 格式同 param.PIPELINE_STAGES: [(名称, 参数字典), ...]"""
+        self.mask_stages = build_mask_stages(stage_specs)
+        self._scaled_stages = {}
+
+    def _stages_for_scale(self, scale):
+        """返回缩放倍数scale下的掩膜处理阶段，核尺寸按比例缩小并保持为奇数，缩小到1的阶段被跳过"""
+        if scale == 1:
+            return self.mask_stages
+        if scale not in self._scaled_stages:
+            scaled = (stage.scaled(scale) for stage in self.mask_stages)
+            self._scaled_stages[scale] = [stage for stage in scaled if stage is not None]
+        return self._scaled_stages[scale]
+
+    def _segment(self, img, scale=1, slot='roi', timed=True, spans=None):
+        """
+        对BGR图像进行颜色分割和掩膜处理(形态学平滑)。scale为该图像相对全分辨率的缩小倍数，用于缩放形态学核。
+        输出写入self.arena中以slot为前缀的复用缓冲区，下一次使用同一slot时会被覆盖。
+        返回 (mask, color_labels)，color_labels 为逐像素颜色标签(0为背景，k对应 self._color_names()[k-1])；没有颜色阈值时mask为None。
+        timed 为 True 时分别记录 mask(颜色分割) 和 morphology(掩膜处理) 耗时；
+        分条/分块的各部分传入 spans 列表，追加 (颜色分割, 掩膜处理) 耗时，由调用方汇总后记录一次(见 _record_segment_spans)。
+        """
+        t0 = time.perf_counter_ns()
+        mask, color_labels = self._segment_colors(img, slot)
+        if mask is None: return None, color_labels
+        t1 = time.perf_counter_ns()
+        mask = self._apply_mask_stages(mask, scale, slot)
+        if spans is not None:
+            spans.append((t1 - t0, time.perf_counter_ns() - t1))
+        elif timed:
+            self.timer.record('mask', t1 - t0)
+            self.timer.record('morphology', time.perf_counter_ns() - t1)
+        return mask, color_labels
+
+    def _record_segment_spans(self, spans, elapsed_ns):
+        """
+        分条/分块分割完成后记录一次 mask 和 morphology 耗时: 按各部分两项耗时之和的比例分摊整段的实际耗时
+        (分条并行时各条的耗时之和大于实际耗时)，两项之和等于整段耗时。
+        """
+        t_mask = sum(span[0] for span in spans)
+        t_total = t_mask + sum(span[1] for span in spans)
+        mask_ns = elapsed_ns * t_mask // t_total if t_total > 0 else 0
+        self.timer.record('mask', mask_ns)
+        self.timer.record('morphology', elapsed_ns - mask_ns if t_total > 0 else 0)
+
+    def _segment_colors(self, img, slot='roi'):
+        """颜色分割，返回未经平滑的 (mask, color_labels)；单通道图像按灰度阈值分割，color_labels 为 None"""
+        h, w = img.shape[:2]
+        arena = self.arena
+        if img.ndim == 2:
+            thresh_type = cv2.THRESH_BINARY if self.mono_polarity == 'bright' else cv2.THRESH_BINARY_INV
+            _, mask = cv2.threshold(img, self._mono_level, 255, thresh_type, dst=arena.get(f"{slot}_mask", (h, w)))
+            return mask, None
+        if self.color_lut is not None:
+            # 查找表只在阈值变化时重建，一次查表同时得到前景掩膜和逐像素颜色标签
+            self.color_lut.update(self.hsv_ranges)
+            color_labels, mask = self.color_lut.lookup(img, arena=arena, slot=slot)
+        else:
+            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV, dst=arena.get(f"{slot}_hsv", (h, w, 3)))
+            # 逐个阈值范围判断，按字典顺序先匹配的范围优先，同时得到颜色标签图和合并后的掩膜
+            color_names = color_names_from_ranges(self.hsv_ranges)
+            color_labels = arena.get(f"{slot}_labels", (h, w))
+            color_labels.fill(0)
+            mask = None
+            for name, (lo, hi) in self.hsv_ranges.items():
+                if mask is None:
+                    mask = cv2.inRange(hsv, np.array(lo), np.array(hi), dst=arena.get(f"{slot}_mask", (h, w)))
+                    m = mask
+                else:
+                    m = cv2.inRange(hsv, np.array(lo), np.array(hi), dst=arena.get(f"{slot}_range_mask", (h, w)))
+                label = color_names.index(color_name_from_range_key(name)) + 1
+                np.copyto(color_labels, label, where=(m > 0) & (color_labels == 0))
+                if m is not mask:
+                    mask = cv2.bitwise_or(mask, m, dst=mask)
+        
+        return mask, color_labels
+
+    def _apply_mask_stages(self, mask, scale=1, slot='roi'):
+        """依次执行掩膜处理阶段 (默认为 开运算5 -> 闭运算9 -> 中值滤波5 的平滑处理)"""
+        h, w = mask.shape[:2]
+        for i, stage in enumerate(self._stages_for_scale(scale)):
+            mask = stage.apply(mask, dst=self.arena.get(f"{slot}_stage{i}", (h, w)))
+        return mask
+
+    def _color_names(self):
+        """当前颜色标签对应的颜色名称列表"""
+        if self.color_lut is not None:
+            return self.color_lut.color_names
+        return color_names_from_ranges(self.hsv_ranges)
+
+    def _update_mono_level(self, img):
+        """单通道图像: 确定本帧的灰度阈值(固定值或由直方图求 Otsu 阈值)，分条和精化窗口都使用同一阈值"""
+        if self.mono_threshold > 0:
+            self._mono_level = self.mono_threshold
+        else:
+            self._mono_level = otsu_threshold(cv2.calcHist([img], [0], None, [256], [0, 256]))
+
+    def _segment_halo(self, scale=1):
+        """分条处理时每条需要额外读入的重叠行数：各掩膜处理阶段影响半径之和"""
+        return sum(stage.halo() for stage in self._stages_for_scale(scale))
+
+    def _get_strip_pool(self):
+        if self._strip_pool is None or self._strip_pool_size != self.strip_workers:
+            if self._strip_pool is not None:
+                self._strip_pool.shutdown(wait=False)
+            self._strip_pool = ThreadPoolExecutor(max_workers=self.strip_workers, thread_name_prefix="strip")
+            self._strip_pool_size = self.strip_workers
+        return self._strip_pool
+
+    def _segment_parallel(self, img, scale=1, slot='roi'):
+        """
+        分条并行版本的 _segment，输出与整幅处理完全一致:
+        每条多读入上下 halo 行，处理后只把中间属于本条的行拷贝到整幅输出中，再交给 findContours。
+        """
+        n_strips = self.strip_workers
+        h, w = img.shape[:2]
+        halo = self._segment_halo(scale)
+        if n_strips <= 1 or h < n_strips * (2 * halo + 1):
+            return self._segment(img, scale, slot)
+        t0 = time.perf_counter_ns()
+        if self.color_lut is not None:
+            # 在主线程中完成查找表检查/重建，避免各线程同时重建
+            self.color_lut.update(self.hsv_ranges)
+        arena = self.arena
+        mask_out = arena.get(f"{slot}_strips_mask", (h, w))
+        labels_out = arena.get(f"{slot}_strips_labels", (h, w)) if img.ndim == 3 else None
+        bounds = [h * i // n_strips for i in range(n_strips + 1)]
+        spans = []
+
+        def run_strip(i):
+            y0, y1 = bounds[i], bounds[i + 1]
+            a, b = max(0, y0 - halo), min(h, y1 + halo)
+            mask, color_labels = self._segment(img[a:b], scale, slot=f"{slot}_strip{i}", spans=spans)
+            if mask is None:
+                return False
+            np.copyto(mask_out[y0:y1], mask[y0 - a:y1 - a])
+            if labels_out is not None:
+                np.copyto(labels_out[y0:y1], color_labels[y0 - a:y1 - a])
+            return True
+
+        if not all(self._get_strip_pool().map(run_strip, range(n_strips))):
+            return None, labels_out
+        self._record_segment_spans(spans, time.perf_counter_ns() - t0)
+        return mask_out, labels_out
+
+    def _segment_tiled(self, img, scale=1, slot='roi', origin=(0, 0), tiled=True):
+        """
+        分块更新版本的 _segment_parallel: 只重新分割脏块(见 motion.DirtyTileMap)，每组相连的脏块多读入 halo 像素，
+        处理后只把属于这些块的部分写入常驻的整幅掩膜和颜色标签图，未变化的块沿用之前的结果。
+        origin 为图像在整帧中的位置，与 slot、图像形状一起区分不同的处理区域。
+        tiled=False (跟踪窗口等每帧位置和尺寸都在变化的区域) 时直接整幅分割。
+        返回 (mask, color_labels, tiles)，未启用分块更新时 tiles 为 None。
+        """
+        if self.tile_size <= 0 or not tiled:
+            return self._segment_parallel(img, scale, slot) + (None,)
+        h, w = img.shape[:2]
+        state_key = (slot, origin, img.shape)
+        state = self._tile_states.pop(state_key, None)
+        if state is None:
+            tiles = DirtyTileMap(max(1, self.tile_size // scale), self.tile_threshold, self.tile_refresh_frames)
+            state = [tiles, np.zeros((h, w), dtype=np.uint8), np.zeros((h, w), dtype=np.uint8) if img.ndim == 3 else None, None]
+        self._tile_states[state_key] = state
+        while len(self._tile_states) > 8: # 只保留最近使用的几个扫描区域(PLC切换区域、ROI变化时)
+            del self._tile_states[next(iter(self._tile_states))]
+        tiles, mask_out, labels_out, held_level = state
+
+        if self.color_lut is not None:
+            self.color_lut.update(self.hsv_ranges)
+        # Otsu 阈值随画面内容逐帧有小幅波动，波动不超过容差时沿用上次的阈值，避免每帧都整幅重新分割；
+        # 沿用的阈值同时用于本帧的精化窗口，保证与常驻掩膜一致
+        if img.ndim == 2 and self.mono_threshold <= 0 and held_level is not None \
+                and abs(self._mono_level - held_level) <= self.tile_mono_tolerance:
+            self._mono_level = held_level
+        state[3] = self._mono_level
+        # 分割参数变化时整幅重新分割
+        key = (self._mono_level, self.mono_polarity, id(self.mask_stages),
+               tuple((name, tuple(lo), tuple(hi)) for name, (lo, hi) in self.hsv_ranges.items()))
+        halo = self._segment_halo(scale)
+        dirty = tiles.update(img, key, halo)
+        if dirty.all():
+            mask, color_labels = self._segment_parallel(img, scale, slot)
+            if mask is None:
+                tiles.reset()
+                return None, color_labels, tiles
+            np.copyto(mask_out, mask)
+            if labels_out is not None:
+                np.copyto(labels_out, color_labels)
+            return mask_out, labels_out, tiles
+
+        # 相连的脏块合并为其外接矩形一次处理(矩形内未变化的块重新分割的结果与之前相同)，减少逐块调用的开销
+        t0 = time.perf_counter_ns()
+        spans = []
+        ts = tiles.tile_size
+        n, _, stats, _ = cv2.connectedComponentsWithStats(dirty.view(np.uint8), connectivity=8)
+        for col, row, n_cols, n_rows in stats[1:, :4]:
+            y0, y1 = row * ts, min((row + n_rows) * ts, h)
+            x0, x1 = col * ts, min((col + n_cols) * ts, w)
+            a, b = max(0, y0 - halo), min(h, y1 + halo)
+            l, r = max(0, x0 - halo), min(w, x1 + halo)
+            mask, color_labels = self._segment(img[a:b, l:r], scale, slot=f"{slot}_tile", spans=spans)
+            if mask is None:
+                tiles.reset()
+                return None, labels_out, tiles
+            np.copyto(mask_out[y0:y1, x0:x1], mask[y0 - a:y1 - a, x0 - l:x1 - l])
+            if labels_out is not None:
+                np.copyto(labels_out[y0:y1, x0:x1], color_labels[y0 - a:y1 - a, x0 - l:x1 - l])
+        self._record_segment_spans(spans, time.perf_counter_ns() - t0) # 没有脏块时两项均记为0
+        return mask_out, labels_out, tiles
+
+    def tile_stats(self):
+        """分块更新的统计: 各处理区域累计的脏块占比和最近一帧的脏块占比"""
+        return {key: state[0].stats() for key, state in self._tile_states.items()}
+
+    def _filter_blobs(self, mask, min_area, slot='roi'):
+        """
+        连通域统计预过滤：对stats数组做一次向量化判断，剔除面积过小/过大和长宽比异常的连通域。
+        返回 (cc_labels, stats, centroids, blob_ids)，blob_ids为通过过滤的连通域编号。
+        """
+        h, w = mask.shape[:2]
+        cc_labels = self.arena.get(f"{slot}_cc_labels", (h, w), np.int32)
+        n, cc_labels, stats, centroids = cv2.connectedComponentsWithStats(mask, labels=cc_labels, connectivity=8, ltype=cv2.CV_32S)
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        bw = stats[1:, cv2.CC_STAT_WIDTH]
+        bh = stats[1:, cv2.CC_STAT_HEIGHT]
+        aspect = np.maximum(bw, bh) / np.maximum(np.minimum(bw, bh), 1)
+        keep = (areas >= min_area) & (areas <= self.max_blob_area_ratio * h * w) & (aspect <= self.max_blob_aspect)
+        blob_ids = np.flatnonzero(keep) + 1 # 跳过背景(编号0)
+        return cc_labels, stats, centroids, blob_ids
+
+    def _trace_blob(self, cc_labels, stats, blob_id, offset_x, offset_y):
+        """只在连通域外接矩形(外扩1像素)内提取该连通域的外轮廓，轮廓坐标加上offset"""
+        h, w = cc_labels.shape[:2]
+        bx, by, bw, bh = stats[blob_id, :4]
+        x0, y0 = max(bx - 1, 0), max(by - 1, 0)
+        x1, y1 = min(bx + bw + 1, w), min(by + bh + 1, h)
+        blob_mask = cv2.compare(cc_labels[y0:y1, x0:x1], int(blob_id), cv2.CMP_EQ)
+        blob_contours, _ = cv2.findContours(blob_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(int(offset_x + x0), int(offset_y + y0)))
+        if not blob_contours:
+            return None
+        return max(blob_contours, key=len)
+
+    def _extract_contours(self, img_roi, x, y, tiled=True):
+        """
+        在ROI图像上分割并提取外轮廓，轮廓坐标为全图像素坐标。
+        返回 (contours, contour_blob_ids, cc_labels, cc_stats, color_labels, seg_scale)，其中cc_labels(连通域编号图)和color_labels
+        为分割所用分辨率下的ROI图像，cc_stats为连通域统计，contour_blob_ids[i] 为第i个轮廓所属的连通域编号，
+        seg_scale为该分辨率相对全分辨率的缩小倍数。tiled 为是否使用分块更新(见 _segment_tiled)。
+        """
+        t0 = time.perf_counter_ns()
+        bayer = isinstance(img_roi, BayerFrame)
+        if self.pyramid_level <= 0 and not bayer:
+            if img_roi.ndim == 2:
+                self._update_mono_level(img_roi)
+            mask, color_labels, tiles = self._segment_tiled(img_roi, origin=(x, y), tiled=tiled)
+            t1 = time.perf_counter_ns()
+            self.timer.record('segment', t1 - t0)
+            if mask is None: return None, None, None, None, None, 1
+            # 先用连通域统计剔除不可能的目标，只对通过的连通域在其外接矩形内提取轮廓
+            # 通过offset将轮廓坐标映射回全图像素坐标（仿射变换使用全图坐标）
+            cc_labels, stats, centroids, blob_ids = self._filter_blobs(mask, self.min_area)
+            if tiles is not None:
+                tiles.mark_rects(stats[blob_ids, :4], mask.shape) # 下一帧重新分割目标所在的块
+            contours, contour_blob_ids = [], []
+            # 连通域按光栅顺序编号，倒序遍历以保持与原 findContours 相同的目标上报顺序
+            for blob_id in blob_ids[::-1]:
+                cnt = self._trace_blob(cc_labels, stats, blob_id, x, y)
+                if cnt is not None:
+                    contours.append(cnt)
+                    contour_blob_ids.append(blob_id)
+            self.timer.record('contours', time.perf_counter_ns() - t1)
+            return contours, contour_blob_ids, cc_labels, stats, color_labels, 1
+
+        # --- 粗检测: 在降采样图像上分割，用连通域统计筛选目标，面积阈值按缩放倍数的平方缩小 ---
+        h, w = img_roi.shape[:2]
+        if bayer:
+            # Bayer原始数据: 2x2单元直接合成的半分辨率图像即为第一级，不做全分辨率去马赛克
+            scale = 1 << max(self.pyramid_level, 1)
+            small_w, small_h = max(1, w // scale), max(1, h // scale)
+            small = img_roi.half()
+            if scale > 2:
+                small = cv2.resize(small, (small_w, small_h), dst=self.arena.get("pyramid_small", (small_h, small_w, 3)), interpolation=cv2.INTER_AREA)
+            window = img_roi.window
+        else:
+            scale = 1 << self.pyramid_level
+            small_w, small_h = max(1, w // scale), max(1, h // scale)
+            small = cv2.resize(img_roi, (small_w, small_h), dst=self.arena.get("pyramid_small", (small_h, small_w) + img_roi.shape[2:]), interpolation=cv2.INTER_AREA)
+            window = lambda x0, y0, x1, y1: img_roi[y0:y1, x0:x1]
+            if img_roi.ndim == 2:
+                self._update_mono_level(small) # 阈值由降采样图像的直方图求得
+        mask_small, color_labels, tiles = self._segment_tiled(small, scale, slot='coarse', origin=(x, y), tiled=tiled)
+        t1 = time.perf_counter_ns()
+        self.timer.record('segment', t1 - t0)
+        if mask_small is None: return None, None, None, None, None, scale
+        # 留出20%余量，避免降采样带来的面积误差漏检，最终仍以全分辨率轮廓面积判断
+        min_area_small = 0.8 * self.min_area / (scale * scale)
+        cc_labels, stats, centroids, blob_ids = self._filter_blobs(mask_small, min_area_small, slot='coarse')
+        if tiles is not None:
+            tiles.mark_rects(stats[blob_ids, :4], mask_small.shape)
+
+        # --- 精化: 在每个目标周围的全分辨率窗口内重新分割，得到全分辨率轮廓 ---
+        contours, contour_blob_ids = [], []
+        refined_rects = set() # 同一目标在粗图上可能被分成多块，精化后会得到相同的轮廓，需去重
+        for blob_id in blob_ids[::-1]:
+            bx, by, bw, bh = stats[blob_id, :4]
+            x0 = max(bx * scale - self.refine_margin, 0)
+            y0 = max(by * scale - self.refine_margin, 0)
+            x1 = min((bx + bw) * scale + self.refine_margin, w)
+            y1 = min((by + bh) * scale + self.refine_margin, h)
+            mask_win, _ = self._segment(window(x0, y0, x1, y1), slot='refine', timed=False)
+            win_contours, _ = cv2.findContours(mask_win, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(int(x + x0), int(y + y0)))
+            if not win_contours: continue
+            # 窗口内可能包含相邻目标的一部分，选取包含粗连通域质心的轮廓，找不到时取面积最大者
+            cx_small, cy_small = centroids[blob_id]
+            center = (x + (cx_small + 0.5) * scale, y + (cy_small + 0.5) * scale)
+            refined = None
+            for cnt in win_contours:
+                if cv2.pointPolygonTest(cnt, center, False) >= 0:
+                    refined = cnt
+                    break
+            if refined is None:
+                refined = max(win_contours, key=cv2.contourArea)
+            refined_rect = cv2.boundingRect(refined)
+            if refined_rect in refined_rects: continue
+            refined_rects.add(refined_rect)
+            contours.append(refined)
+            contour_blob_ids.append(blob_id)
+        self.timer.record('contours', time.perf_counter_ns() - t1) # 含各目标窗口的全分辨率精化
+        return contours, contour_blob_ids, cc_labels, stats, color_labels, scale
+
+    def _classify_shapes(self, candidates):
+        """
+        批量完成形状判断和参考向量(角度)计算，结果写回每个候选项的 shape / ref_vector / angle_deg 字段。
+        形状由规则(按逼近多边形的顶点数分组判断)或模板库(与参考形状的特征比较，见 shape_templates.py)给出，
+        参考向量的计算与形状的来源无关，见 process_math 中的批量函数。
+        """
+        for cand in candidates:
+            cand["shape"], cand["ref_vector"], cand["angle_deg"] = 'unknown', None, -1.0
+        if not candidates:
+            return
+        if self.shape_library is not None:
+            labels, _ = self.shape_library.classify([cand["contour"] for cand in candidates])
+        else:
+            labels = self._rule_labels(candidates)
+        for cand, label in zip(candidates, labels): cand["shape"] = label
+
+        def assign(indices, starts, ends, angles=None):
+            if angles is None:
+                angles = batch_vector_angles_0_360(starts, ends)
+            for i, start, end, angle in zip(indices, starts, ends, angles):
+                candidates[i]["ref_vector"] = (start, end)
+                candidates[i]["angle_deg"] = angle
+
+        def polys(indices):
+            return np.stack([candidates[i]["approx"] for i in indices])
+
+        def assign_moments(idx):
+            # 矩形/菱形：二阶中心矩的主轴方向(180度周期)；正方形：凸包边界的4次谐波(90度周期)
+            # 参考向量过轮廓质心，长度为外接矩形长边，方向约定与顶点方式相同(终点y不小于起点)
+            mu = np.array([candidates[i]["mu"] for i in idx])
+            angles = batch_axis_orientation(mu[:, 0], mu[:, 1], mu[:, 2])
+            square = labels[idx] == 'square'
+            if square.any():
+                angles[square] = batch_fourfold_orientation([candidates[i]["hull"] for i in idx[square]])
+            centers = np.array([candidates[i]["center"] for i in idx])
+            lengths = np.array([candidates[i]["size"] for i in idx])
+            assign(idx, *batch_axis_reference(centers, angles, lengths), angles)
+
+        # 只对需要分析(上报或调试)的形状计算参考向量。顶点方式要求逼近多边形的顶点数与形状一致
+        # (模板分类时可能不一致，例如圆角正方形逼近出5个顶点)：不一致的矩形/正方形/菱形改用轮廓矩计算角度
+        # (正方形为 [0, 90)，与顶点方式相差90度的整数倍，对正方形等价)，
+        # 其余形状不一致时没有参考向量，不上报(见 report_objects)
+        wanted = np.array([self._analyzes_shape(label) for label in labels], dtype=bool)
+        num_vertices = np.array([len(cand["approx"]) for cand in candidates])
+        regular = wanted & np.isin(labels, ['rectangle', 'square', 'diamond'])
+        if self.orientation_method == 'moments':
+            if regular.any():
+                assign_moments(np.flatnonzero(regular))
+        else:
+            idx = np.flatnonzero(regular & (num_vertices == 4))
+            if len(idx):
+                # 矩形/正方形/菱形：两条对边中点连线，从y较小的中点指向y较大的中点
+                p = polys(idx)
+                starts, ends = batch_order_top_first(batch_midpoints(p[:, 0], p[:, 1]), batch_midpoints(p[:, 2], p[:, 3]))
+                assign(idx, starts, ends)
+            idx = np.flatnonzero(regular & (num_vertices != 4))
+            if len(idx):
+                assign_moments(idx)
+        # 梯形：从长底边中点指向短底边中点
+        idx = np.flatnonzero(wanted & (labels == 'trapezoid') & (num_vertices == 4))
+        if len(idx):
+            valid, _, _, mid_long, mid_short = batch_trapezoid_bases(polys(idx))
+            assign(idx[valid], mid_long[valid], mid_short[valid])
+        idx = np.flatnonzero(wanted & (labels == 'triangle') & (num_vertices == 3))
+        if len(idx):
+            centers = np.array([candidates[i]["centroid"] for i in idx]) # 使用原始轮廓质心
+            assign(idx, *batch_triangle_reference(polys(idx), centers))
+        idx = np.flatnonzero(wanted & (labels == 'hexagon') & (num_vertices == 6))
+        if len(idx):
+            valid, _, mid1, mid2 = batch_hexagon_parallel_pair(polys(idx))
+            starts, ends = batch_order_top_first(mid1[valid], mid2[valid])
+            assign(idx[valid], starts, ends)
+
+    def _rule_labels(self, candidates):
+        """规则形状判断: 按逼近多边形的顶点数分组，3/6个顶点为三角形/六边形，4个顶点按边长和角度细分，其余按凸包圆度判断是否为圆"""
+        labels = np.empty(len(candidates), dtype=object)
+        groups = {}
+        for i, cand in enumerate(candidates):
+            groups.setdefault(len(cand["approx"]), []).append(i)
+        for num_vertices, indices in groups.items():
+            indices = np.array(indices)
+            if num_vertices == 3:
+                labels[indices] = 'triangle'
+            elif num_vertices == 4:
+                labels[indices] = batch_classify_quadrilaterals(np.stack([candidates[i]["approx"] for i in indices]))
+            elif num_vertices == 6:
+                labels[indices] = 'hexagon'
+            else:
+                for i in indices:
+                    cand = candidates[i]
+                    area_hull = cv2.contourArea(cand["hull"]) # 凸包的面积
+                    perimeter_hull = cand["perimeter_hull"]
+                    circularity_hull = 4*np.pi*area_hull/(perimeter_hull**2) if perimeter_hull > 0 else 0
+                    labels[i] = 'circle' if circularity_hull > 0.75 else f'polygon{num_vertices}'
+        return labels
+
+    def _analyzes_shape(self, shape_label):
+        """该形状是否需要完整分析(参考向量、坐标、颜色)"""
+        return self.debug_all_shapes or shape_label in self.reported_shapes
+
+    def _passes_shape_gate(self, w_rect, h_rect, area_cnt):
+        """
+        形状快速预判: 由最小外接矩形的长宽比和填充率判断轮廓是否还可能成为某种上报形状。
+        只要有一种上报形状没有预判条件或满足其条件即通过。
+        """
+        if w_rect <= 0 or h_rect <= 0: return True
+        aspect = max(w_rect, h_rect) / min(w_rect, h_rect)
+        extent = area_cnt / (w_rect * h_rect)
+        for shape in self.reported_shapes:
+            gate = self.shape_gates.get(shape)
+            if gate is None: return True
+            max_aspect, min_extent = gate
+            if aspect <= max_aspect and extent >= min_extent: return True
+        return False
+
+    def _vote_colors(self, cc_labels, color_labels, n_colors, n_components, bbox=None):
+        """
+        对所有连通域一次性统计颜色标签: 以 连通域编号*(颜色数+1)+颜色标签 为索引做一次 bincount，
+        返回 (n_components, 颜色数+1) 的计数表(只统计编号小于n_components的连通域)，第0列为背景(未匹配任何颜色)的像素数。
+        bbox=(x0, y0, x1, y1) 时只统计该范围(应包含所有待投票的连通域)。
+        """
+        if bbox is not None:
+            x0, y0, x1, y1 = bbox
+            cc_labels, color_labels = cc_labels[y0:y1, x0:x1], color_labels[y0:y1, x0:x1]
+        h, w = cc_labels.shape[:2]
+        n_bins = n_colors + 1
+        idx = self.arena.get_contiguous("vote_idx", (h, w), np.intp) # 连续的 intp 数组，bincount 不再临时复制
+        np.multiply(cc_labels, n_bins, out=idx)
+        np.add(idx, color_labels, out=idx, casting='unsafe')
+        counts = np.bincount(idx.reshape(-1), minlength=n_components * n_bins)
+        return counts[:n_components * n_bins].reshape(n_components, n_bins)
+
+    def detect(self, original_img, roi_rect=None, window=False):
+        """
+        只做检测，不绘制任何叠加图形，也不复制整幅图像。original_img 为BGR图像或 BayerFrame(见 wrap_bayer)。
+        返回 (objects, roi_rect)：objects 为所有通过过滤的目标(含绘制所需的几何信息)，roi_rect 为裁剪后实际使用的ROI。
+        window=True 表示 roi_rect 是已包含完整目标的小窗口(如跟踪窗口)，分割时不再外扩 roi_padding，也不做分块更新。
+        """
+        t0 = time.perf_counter_ns()
+        result = self._detect(original_img, roi_rect, window)
+        self.timer.record('detect', time.perf_counter_ns() - t0)
+        return result
+
+    def _detect(self, original_img, roi_rect=None, window=False):
+        if original_img.ndim == 3 and original_img.shape[2] == 1:
+            original_img = original_img[:, :, 0] # (H, W, 1) 的黑白图像按单通道处理
+        h_full, w_full = original_img.shape[:2]
+        self.arena.begin_frame(original_img.shape)
+        # --- 应用ROI：只对当前扫描区域进行像素级处理 ---
+        roi_rect = self._clip_roi(roi_rect, w_full, h_full)
+        if roi_rect is not None and (roi_rect[2] == 0 or roi_rect[3] == 0):
+            return [], None # ROI不在图像范围内: 没有检测结果
         if roi_rect is not None:
-            starttime = time.time()
-            # "擦亮" ROI 区域，恢复其原始内容
             x, y, w, h = roi_rect
-            img_display[y:y+h, x:x+w] = original_img[y:y+h, x:x+w]
-            # 绘制清晰的ROI边框
-            cv2.rectangle(img_display, (x, y), (x+w, y+h), (255, 255, 0), 3)
-            #print(f"应用ROI: {roi_rect}, 耗时: {time.time() - starttime:.4f} 秒")
         else:
-            x,y,w,h= 0, 0, img_display.shape[1], img_display.shape[0] # 如果没有ROI，使用全图
+            x,y,w,h= 0, 0, w_full, h_full # 如果没有ROI，使用全图
+        if isinstance(original_img, BayerFrame):
+            # Bayer数据的ROI起点向下对齐到偶数，保持排列相位
+            w, h = w + (x & 1), h + (y & 1)
+            x, y = x & ~1, y & ~1
+            if roi_rect is not None:
+                roi_rect = (x, y, w, h)
+        # 分割区域: ROI向外扩展 roi_padding (限制在图像范围内)，使跨ROI边界的工件完整分割
+        pad = 0 if roi_rect is None or window else self.roi_padding
+        sx, sy = max(x - pad, 0), max(y - pad, 0)
+        if isinstance(original_img, BayerFrame):
+            sx, sy = sx & ~1, sy & ~1
+        sw, sh = min(x + w + pad, w_full) - sx, min(y + h + pad, h_full) - sy
+        # 分割区域的裁剪（切片视图，不复制数据），后续所有像素运算只在该区域内进行
+        if isinstance(original_img, BayerFrame):
+            img_roi = original_img.crop(sx, sy, sw, sh)
+        else:
+            img_roi = original_img[sy:sy+sh, sx:sx+sw]
 
-        # --- 对原始、完整的图像进行颜色分割和轮廓提取 ---
-        hsv = cv2.cvtColor(original_img, cv2.COLOR_BGR2HSV)
-        
-        # 合并所有颜色掩膜
-        mask = None
-        for lo, hi in self.hsv_ranges.values():
-            m = cv2.inRange(hsv, np.array(lo), np.array(hi))
-            mask = m if mask is None else cv2.bitwise_or(mask, m)
-        
-        if mask is None: return img_display, [] 
-
-        # 形态学操作 (保持上一版本中的平滑处理)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel_open, iterations=1)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.kernel_close, iterations=1)
-        mask = cv2.medianBlur(mask, 5)
-         
-        # 轮廓提取 (修正)
-        contours, hierarchy = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # --- 对分割区域进行颜色分割和轮廓提取 ---
+        contours, contour_blob_ids, cc_labels, cc_stats, color_labels, seg_scale = self._extract_contours(img_roi, sx, sy, tiled=not window)
+        if contours is None: return [], roi_rect
+        t_analysis = time.perf_counter_ns() # 逐轮廓分析、形状判断、颜色投票和坐标转换
         
-        h_img, w_img = original_img.shape[:2] 
-        img_total_area = h_img * w_img
+        img_total_area = h * w # 以处理区域面积作为过大轮廓的判断基准
         
-        # --- 新增：用于存储所有检测到的物料信息，包括机械臂坐标 ---
-        detected_objects_info = []
-        detected_objects_info.clear() # 确保每次处理前清空
+        # --- 用于存储所有检测到的物料信息，包括机械臂坐标和绘制所需的几何信息 ---
+        objects = []
+        candidates = [] # 通过过滤的轮廓，形状判断前的中间结果
+        self.shape_counts = Counter()
         
-        for cnt in contours:
+        for cnt, blob_id in zip(contours, contour_blob_ids):
             area_cnt = cv2.contourArea(cnt) # 原始轮廓的面积
             if area_cnt < self.min_area: continue
 
@@ -115,202 +703,286 @@ class Processor:
             rect = cv2.minAreaRect(cnt)
             (cx_rect_float, cy_rect_float), (w_rect, h_rect), angle_from_cv2 = rect 
             box_points = cv2.boxPoints(rect).astype(int) 
-            cv2.drawContours(img_display, [box_points], -1, (128,0,128), self.line_thickness2 -1 if self.line_thickness2 > 1 else 1)
             
+            # 上报的中心点: 轮廓质心(亚像素) 或 最小外接矩形中心
+            if self.orientation_method == 'moments':
+                center = (cx_centroid, cy_centroid)
+            else:
+                center = (cx_rect_float, cy_rect_float)
+
             # 【核心修改 2】根据中心点位置过滤物体
             if roi_rect is not None:
-                x, y, w, h = roi_rect
                 # 如果中心点不在ROI内部，则跳过此轮廓
-                if not (x <= cx_rect_float < x + w and y <= cy_rect_float < y + h):
+                if not (x <= center[0] < x + w and y <= center[1] < y + h):
                     continue
 
+            # --- 形状快速预判: 不可能成为上报形状的轮廓不再做凸包逼近等分析 ---
+            if not self.debug_all_shapes and not self._passes_shape_gate(w_rect, h_rect, area_cnt):
+                self.shape_counts['gated'] += 1
+                continue
+
             # --- 基于凸包 `hull` 进行形状分析 ---
             hull = cv2.convexHull(cnt) # 计算原始轮廓的凸包
             perimeter_hull = cv2.arcLength(hull, True) # 凸包的周长
-            area_hull = cv2.contourArea(hull)          # 凸包的面积
 
-            # 对凸包进行多边形逼近
+            # 对凸包进行多边形逼近，形状判断和参考向量在所有轮廓收集完后批量计算
             approx_hull = cv2.approxPolyDP(hull, self.eps_factor * perimeter_hull, True)
-            num_vertices_hull = len(approx_hull)
+            candidates.append({
+                "blob_id": blob_id,
+                "centroid": (cx_centroid, cy_centroid),
+                "center": center,
+                "mu": (M['mu20'], M['mu02'], M['mu11']),
+                "size": max(w_rect, h_rect),
+                "box_points": box_points,
+                "hull": hull,
+                "perimeter_hull": perimeter_hull,
+                "approx": approx_hull.reshape(-1, 2),
+                "contour": cnt,
+            })
 
-            # 绘制凸包轮廓 (绿色)
-            cv2.drawContours(img_display, [hull], -1, (0,255,0), self.line_thickness2)
-            # 形状判断 (基于凸包的顶点数 `num_vertices_hull` 和 `approx_hull`)
-            shape_label = 'unknown'
-            approx_hull_reshaped = approx_hull.reshape(-1, 2) # 转换为 N x 2 形状
-
-            if num_vertices_hull == 3: shape_label = 'triangle'
-            elif num_vertices_hull == 4:
-                # --- 四边形判断逻辑修改区域 ---
-                side_lengths = [np.linalg.norm(approx_hull_reshaped[i] - approx_hull_reshaped[(i + 1) % 4]) for i in range(4)]
-                interior_angles = calculate_interior_angles(approx_hull_reshaped)
-
-                angle_tolerance = 15  # 内角与90度的容差（度）
-                side_relative_tolerance = 0.15 # 边长相对容差 (15%)
-
-                # 检查所有内角是否约等于90度
-                all_angles_approx_90 = False
-                if len(interior_angles) == 4: # 确保计算出4个角
-                    all_angles_approx_90 = all(abs(angle - 90) < angle_tolerance for angle in interior_angles)
-                
-                # 检查所有边是否约等长
-                all_sides_approx_equal = False
-                if side_lengths: # 确保边长列表不为空
-                    all_sides_approx_equal = (max(side_lengths) - min(side_lengths)) < side_relative_tolerance * (max(side_lengths) + 1e-6) # 加epsilon避免max为0
-
-                # 检查对边是否约等长 (side0 vs side2, side1 vs side3)
-                opposite_sides_approx_equal = False
-                if len(side_lengths) == 4:
-                    s0, s1, s2, s3 = side_lengths
-                    # 比较时，分母使用两条比较边中的较大者，或加上一个极小值避免除零
-                    cond1 = abs(s0 - s2) < side_relative_tolerance * max(s0, s2, 1e-6) 
-                    cond2 = abs(s1 - s3) < side_relative_tolerance * max(s1, s3, 1e-6)
-                    opposite_sides_approx_equal = cond1 and cond2
-
-                if all_sides_approx_equal and all_angles_approx_90:
-                    shape_label = 'square'  # 正方形：四边等长，四角相等且为90度
-                elif all_sides_approx_equal: # 隐含条件: 角度不都为90 (已被正方形条件覆盖)
-                    shape_label = 'diamond' # 菱形：四边等长
-                elif opposite_sides_approx_equal and all_angles_approx_90: # 隐含条件: 四边不都等长 (已被正方形条件覆盖)
-                    shape_label = 'rectangle' # 矩形：对边等长，四角相等且为90度
-                elif is_trapezoid(approx_hull): # 使用用户定义的梯形判断
-                    shape_label = 'trapezoid'
-            
-            elif num_vertices_hull == 6: 
-                shape_label = 'hexagon'
-            else: 
-                circularity_hull = 4*np.pi*area_hull/(perimeter_hull**2) if perimeter_hull > 0 else 0
-                shape_label = 'circle' if circularity_hull > 0.75 else f'polygon{num_vertices_hull}' 
-            
-            # --- 新的角度计算逻辑 ---
-            display_angle_text = "N/A"
-            calculated_angle_0_360 = -1.0 
-            ref_vec_start_pt, ref_vec_end_pt = None, None 
+        # --- 批量形状判断和角度计算 ---
+        self._classify_shapes(candidates)
 
-            if shape_label != 'circle':
-                approx_hull_reshaped = approx_hull.reshape(-1, 2)
-
-                if shape_label == 'triangle':
-                    if num_vertices_hull == 3:
-                        # 计算三角形质心 (也可以用原始轮廓的质心 cx_centroid, cy_centroid)
-                        # M_hull = cv2.moments(approx_hull) # 用凸包的顶点计算质心
-                        # cx_triangle_center = M_hull['m10'] / (M_hull['m00'] + 1e-6)
-                        # cy_triangle_center = M_hull['m01'] / (M_hull['m00'] + 1e-6)
-                        triangle_center = np.array([cx_centroid, cy_centroid]) # 使用原始轮廓质心
-
-                        vertices = approx_hull_reshaped
-                        distances_to_center = [np.linalg.norm(v - triangle_center) for v in vertices]
-                        
-                        closest_vertex_idx = np.argmin(distances_to_center)
-                        ref_vec_end_pt = vertices[closest_vertex_idx] # 终点：离中心最近的顶点
-
-                        # 另外两个顶点构成一条边
-                        other_vertices_indices = [i for i in range(3) if i != closest_vertex_idx]
-                        p_side1 = vertices[other_vertices_indices[0]]
-                        p_side2 = vertices[other_vertices_indices[1]]
-                        ref_vec_start_pt = get_midpoint(p_side1, p_side2) # 起点：远边的中点
-                
-                elif shape_label == 'trapezoid':
-                    bases = find_trapezoid_bases(approx_hull_reshaped)
-                    if bases and bases[0] and bases[1]:
-                        (long_base_p1, long_base_p2), (short_base_p1, short_base_p2) = bases
-                        mid_long_base = get_midpoint(long_base_p1, long_base_p2)
-                        mid_short_base = get_midpoint(short_base_p1, short_base_p2)
-                        ref_vec_start_pt = mid_long_base
-                        ref_vec_end_pt = mid_short_base
-                
-                elif shape_label == 'hexagon':
-                    if num_vertices_hull == 6:
-                        parallel_side_pair = find_hexagon_parallel_side_pair(approx_hull_reshaped)
-                        if parallel_side_pair:
-                            (side1_p1, side1_p2), (side2_p1, side2_p2) = parallel_side_pair
-                            mid1 = get_midpoint(side1_p1, side1_p2)
-                            mid2 = get_midpoint(side2_p1, side2_p2)
-                            # 确保向量方向一致性，例如从y较小的中点指向y较大的中点
-                            if mid1[1] < mid2[1] or (mid1[1] == mid2[1] and mid1[0] < mid2[0]):
-                                ref_vec_start_pt = mid1
-                                ref_vec_end_pt = mid2
-                            else:
-                                ref_vec_start_pt = mid2
-                                ref_vec_end_pt = mid1
-                
-                elif shape_label in ['rectangle', 'square', 'diamond']:
-                    if num_vertices_hull == 4:
-                        mid1 = get_midpoint(approx_hull_reshaped[0], approx_hull_reshaped[1])
-                        mid2 = get_midpoint(approx_hull_reshaped[2], approx_hull_reshaped[3])
-                        if mid1[1] < mid2[1] or (mid1[1] == mid2[1] and mid1[0] < mid2[0]):
-                             ref_vec_start_pt = mid1; ref_vec_end_pt = mid2
-                        else: ref_vec_start_pt = mid2; ref_vec_end_pt = mid1
-                
-                if ref_vec_start_pt is not None and ref_vec_end_pt is not None:
-                    calculated_angle_0_360 = get_vector_angle_0_360(ref_vec_start_pt, ref_vec_end_pt)
-                    display_angle_text = f"{calculated_angle_0_360:.1f}"
-                    cv2.arrowedLine(img_display, tuple(ref_vec_start_pt.astype(int)), tuple(ref_vec_end_pt.astype(int)), 
-                                    (255, 100, 0), self.line_thickness2)
-
-             # --- 坐标转换和显示 ---
-            robot_x_str, robot_y_str = "N/A", "N/A" # 初始化为N/A
-            pixel_x_to_transform = float(cx_rect_float) # 使用最小外接矩形中心作为待转换点
-            pixel_y_to_transform = float(cy_rect_float)
-
-            if self.affine_transform_matrix is not None:
-                C = self.affine_transform_matrix
-                robot_x = pixel_x_to_transform * C[0,0] + pixel_y_to_transform * C[1,0] + C[2,0]
-                robot_y = pixel_x_to_transform * C[0,1] + pixel_y_to_transform * C[1,1] + C[2,1]
-                robot_x = -robot_x # 注意：C#代码中Y轴方向是向下的，这里需要取反
-                robot_y = -robot_y
-                robot_x_str = f"{robot_x:.2f}"
-                robot_y_str = f"{robot_y:.2f}"
+        analyzed = []
+        for cand in candidates:
+            if self._analyzes_shape(cand["shape"]):
+                analyzed.append(cand)
             else:
-                print("警告: 仿射变换矩阵未加载，无法进行坐标转换。")
-                
-            # --- 绘制文本和标记 (保持不变) ---
-            cx_rect_int = int(cx_rect_float)
-            cy_rect_int = int(cy_rect_float)
-            color_label = 'N/A' 
-            if 0 <= cy_rect_int < h_img and 0 <= cx_rect_int < w_img: 
-                hsv_pixel_value = hsv[cy_rect_int, cx_rect_int]
-                for name, (lo, hi) in self.hsv_ranges.items():
-                    lo_np, hi_np = np.array(lo), np.array(hi)
-                    if np.all(hsv_pixel_value >= lo_np) and np.all(hsv_pixel_value <= hi_np):
-                        color_label = name.replace('1','').replace('2','') 
-                        break
+                self.shape_counts[cand["shape"]] += 1 # 不上报的形状只计数，不做坐标和颜色计算
+
+        # --- 颜色判断: 所有目标一次性按连通域内的颜色标签投票 ---
+        color_names = self._color_names()
+        if analyzed and color_labels is not None:
+            # 只统计包含所有目标连通域的最小范围(分割分辨率下的ROI坐标)
+            rects = cc_stats[[cand["blob_id"] for cand in analyzed], :4]
+            bbox = (rects[:, 0].min(), rects[:, 1].min(), (rects[:, 0] + rects[:, 2]).max(), (rects[:, 1] + rects[:, 3]).max())
+            votes = self._vote_colors(cc_labels, color_labels, len(color_names), max(cand["blob_id"] for cand in analyzed) + 1, bbox)
+
+        # --- 坐标转换: 所有目标的中心点一次性去畸变并乘以标定矩阵 ---
+        if analyzed:
+            robot_points = self.calibration.pixel_to_robot([cand["center"] for cand in analyzed])
+
+        for k, cand in enumerate(analyzed):
+            shape_label = cand["shape"]
+            cx_center, cy_center = cand["center"]
+            ref_vec_start_pt, ref_vec_end_pt = cand["ref_vector"] if cand["ref_vector"] is not None else (None, None)
+            calculated_angle_0_360 = cand["angle_deg"]
+
+            robot_x, robot_y = float(robot_points[k, 0]), float(robot_points[k, 1])
+
+            # --- 颜色: 连通域内得票最多的颜色标签，得票占比作为置信度 ---
+            color_label, color_confidence = 'N/A', 0.0
+            if color_labels is None:
+                color_label = 'unknown' # 黑白图像没有颜色信息
+            else:
+                counts = votes[cand["blob_id"]]
+                if counts.sum() > 0:
+                    winner = int(np.argmax(counts[1:])) + 1 # 不统计背景(标签0)
+                    if counts[winner] > 0:
+                        color_label = color_names[winner - 1]
+                        color_confidence = float(counts[winner] / counts.sum())
+            
+            objects.append({
+                "shape": shape_label,
+                "color": color_label,
+                "color_confidence": color_confidence,
+                "angle_deg": calculated_angle_0_360 if shape_label != 'circle' else -1.0, # -1.0 表示圆形
+                "robot_x": robot_x,
+                "robot_y": robot_y,
+                "pixel_x": float(cx_center),
+                "pixel_y": float(cy_center),
+                # 以下为绘制叠加图形所需的几何信息
+                "box_points": cand["box_points"],
+                "hull": cand["hull"],
+                "ref_vector": (ref_vec_start_pt, ref_vec_end_pt) if ref_vec_start_pt is not None and ref_vec_end_pt is not None else None,
+            })
             
-            text_base_x = cx_rect_int + 20  
-            text_base_y = cy_rect_int - 20  
-            line_spacing = int(40 * self.font_scale)
+        self.timer.record('analysis', time.perf_counter_ns() - t_analysis)
+        return objects, roi_rect
+
+    def report_objects(self, objects, frame_id=0):
+        """
+        从检测结果中挑选需要上报给PLC的目标，返回 DetectedObject 列表。
+        圆形以外没有参考向量(无法确定角度)的目标不上报，避免把 -1 当作实际角度发送给PLC。
+        """
+        return [DetectedObject(obj["shape"], obj["color"], obj["angle_deg"], obj["robot_x"], obj["robot_y"],
+                               obj["pixel_x"], obj["pixel_y"], color_confidence=obj["color_confidence"],
+                               frame_id=frame_id, track_id=obj.get("track_id")) # 未启用跟踪时track_id为None
+                for obj in objects if obj["shape"] in self.reported_shapes
+                and (obj["shape"] == 'circle' or obj.get("ref_vector") is not None)]
+
+    def render(self, img_display, objects, roi_rect=None, scale=(1.0, 1.0)):
+        """
+        将检测结果绘制到img_display上(原地修改)。img_display可以是缩小后的显示图像，
+        scale为 (x方向, y方向) 相对全分辨率的缩放比例，线宽、字体等随之缩放。
+        """
+        fx, fy = scale
+        s = min(fx, fy)
+        def pt(p):
+            return (int(round(p[0] * fx)), int(round(p[1] * fy)))
+        def pts(arr):
+            return np.round(np.asarray(arr, dtype=np.float64).reshape(-1, 2) * (fx, fy)).astype(np.int32)
+        def thick(t):
+            return max(1, int(round(t * s)))
+        font_scale = self.font_scale * s
+        text_thickness = thick(self.text_thickness)
+        line_spacing = int(40 * font_scale)
+
+        if roi_rect is not None:
+            x, y, w, h = roi_rect
+            # 绘制清晰的ROI边框
+            cv2.rectangle(img_display, pt((x, y)), pt((x+w, y+h)), (255, 255, 0), thick(3))
+            if objects:
+                cv2.rectangle(img_display, pt((x, y)), pt((x + w, y + h)), (0, 255, 255), thick(4)) # 黄色，粗线条
 
-            cv2.rectangle(img_display, (x, y), (x + w, y + h), (0, 255, 255), 4) # 黄色，粗线条
+        for obj in objects:
+            shape_label = obj["shape"]
+            cv2.drawContours(img_display, [pts(obj["box_points"])], -1, (128,0,128), thick(self.line_thickness2 -1 if self.line_thickness2 > 1 else 1))
+            # 绘制凸包轮廓 (绿色)
+            cv2.drawContours(img_display, [pts(obj["hull"])], -1, (0,255,0), thick(self.line_thickness2))
+            if obj["ref_vector"] is not None:
+                ref_vec_start_pt, ref_vec_end_pt = obj["ref_vector"]
+                cv2.arrowedLine(img_display, pt(ref_vec_start_pt), pt(ref_vec_end_pt), (255, 100, 0), thick(self.line_thickness2))
+
+            cx_int, cy_int = pt((int(obj["pixel_x"]), int(obj["pixel_y"])))
+            text_base_x = cx_int + int(20 * s)
+            text_base_y = cy_int - int(20 * s)
             #(200,255,200)青色
-            cv2.circle(img_display, (cx_rect_int, cy_rect_int), self.dot_radius, (0,0,255), -1) 
+            cv2.circle(img_display, (cx_int, cy_int), thick(self.dot_radius), (0,0,255), -1) 
 
+            robot_x_str = f"{obj['robot_x']:.2f}" if obj["robot_x"] is not None else "N/A"
+            robot_y_str = f"{obj['robot_y']:.2f}" if obj["robot_y"] is not None else "N/A"
             cv2.putText(img_display, f"X-Y:({robot_x_str},{robot_y_str})", (text_base_x, text_base_y),
-                        cv2.FONT_HERSHEY_SIMPLEX, self.font_scale * 0.9, (24,240,240), self.text_thickness, cv2.LINE_AA) # 稍小字体，不同颜色
-            cv2.putText(img_display, f"C:{color_label}", (text_base_x, text_base_y + line_spacing),
-                        cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (24,240,240), self.text_thickness, cv2.LINE_AA)
-            cv2.putText(img_display, f"S:{shape_label}", (text_base_x, text_base_y + 2*line_spacing),
-                        cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (24,240,240), self.text_thickness, cv2.LINE_AA)
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale * 0.9, (24,240,240), text_thickness, cv2.LINE_AA) # 稍小字体，不同颜色
+            cv2.putText(img_display, f"C:{obj['color']}", (text_base_x, text_base_y + line_spacing),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (24,240,240), text_thickness, cv2.LINE_AA)
+            cv2.putText(img_display, f"S:{shape_label}" if obj.get("track_id") is None else f"S:{shape_label} #{obj['track_id']}", (text_base_x, text_base_y + 2*line_spacing),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (24,240,240), text_thickness, cv2.LINE_AA)
             if shape_label != 'circle':
+                display_angle_text = f"{obj['angle_deg']:.1f}" if obj["ref_vector"] is not None else "N/A"
                 cv2.putText(img_display, f"A:{display_angle_text}", (text_base_x, text_base_y + 3*line_spacing),
-                            cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, (24,240,240), self.text_thickness, cv2.LINE_AA)
-            
-            if shape_label == 'circle' or shape_label == 'square':
-                # 存储信息 (如果需要返回给调用者)
-                current_object_data = {
-                    "shape": shape_label,
-                    "color": color_label,
-                    "angle_deg": calculated_angle_0_360 if shape_label != 'circle' else -1.0, # -1.0 表示圆形
-                    "robot_x": robot_x, 
-                    "robot_y": robot_y
-                }
-                detected_objects_info.append(current_object_data)
-            
+                            cv2.FONT_HERSHEY_SIMPLEX, font_scale, (24,240,240), text_thickness, cv2.LINE_AA)
+        return img_display
+
+    def render_for_display(self, original_img, objects, roi_rect, display_size):
+        """先将原图缩放到显示尺寸 (宽, 高)，再在显示分辨率下绘制叠加图形，避免在全分辨率图像上绘制"""
+        t0 = time.perf_counter_ns()
+        h_full, w_full = original_img.shape[:2]
+        display_w, display_h = display_size
+        if isinstance(original_img, BayerFrame):
+            original_img = original_img.half() # Bayer数据用半分辨率图像显示，坐标缩放仍按全分辨率计算
+        img_display = cv2.resize(original_img, (display_w, display_h), interpolation=cv2.INTER_AREA)
+        if img_display.ndim == 2 or img_display.shape[2] == 1:
+            img_display = cv2.cvtColor(img_display, cv2.COLOR_GRAY2BGR) # 黑白图像在显示尺寸下转为彩色以绘制叠加图形
+        self.render(img_display, objects, roi_rect, scale=(display_w / w_full, display_h / h_full))
+        self.timer.record('render', time.perf_counter_ns() - t0)
+        return img_display
+
+    def process(self, original_img, roi_rect=None, render=True):
+        """
+        检测并返回 (img_display, detected_objects_info)。
+        render=False 为无界面(headless)模式：不复制整幅图像、不绘制，img_display 返回 None。
+        BayerFrame 输入时 img_display 为半分辨率图像(与 render_for_display 相同，不做全分辨率去马赛克)。
+        """
+        objects, roi_rect = self.detect(original_img, roi_rect)
+        detected_objects_info = self.report_objects(objects)
+        if not render:
+            return None, detected_objects_info
+        t0 = time.perf_counter_ns()
+        scale = (1.0, 1.0)
+        if isinstance(original_img, BayerFrame):
+            img_display = original_img.half().copy()
+            scale = (img_display.shape[1] / original_img.shape[1], img_display.shape[0] / original_img.shape[0])
+        elif original_img.ndim == 2 or original_img.shape[2] == 1:
+            img_display = cv2.cvtColor(original_img, cv2.COLOR_GRAY2BGR)
+        else:
+            img_display = original_img.copy()# 用于绘制结果的图像
+        self.render(img_display, objects, roi_rect, scale=scale)
+        self.timer.record('render', time.perf_counter_ns() - t0)
         #print(f"检测到物体: {detected_objects_info}")
         return img_display, detected_objects_info
 
+def benchmark_strip_workers(img, worker_counts=(1, 2, 4, 8), repeat=10, roi_rect=None):
+    """对不同的分条并行线程数测量分割+检测耗时，返回 {线程数: 平均毫秒}"""
+    processor = Processor()
+    results = {}
+    for workers in worker_counts:
+        processor.strip_workers = workers
+        processor.detect(img, roi_rect) # 预热：创建线程池和复用缓冲区
+        starttime = time.perf_counter()
+        for _ in range(repeat):
+            processor.detect(img, roi_rect)
+        results[workers] = (time.perf_counter() - starttime) / repeat * 1000
+        print(f"分条线程数 {workers}: 平均 {results[workers]:.1f} ms/帧")
+    return results
+
+def benchmark_stages(img, repeat=10, roi_rect=None, processor=None):
+    """分别测量颜色分割、各掩膜处理阶段和完整检测的耗时，返回 {阶段: 平均毫秒}"""
+    processor = processor or Processor()
+    h_img, w_img = img.shape[:2]
+    processor.arena.begin_frame(img.shape)
+    roi_rect = processor._clip_roi(roi_rect, w_img, h_img)
+    if roi_rect is not None and (roi_rect[2] == 0 or roi_rect[3] == 0):
+        raise ValueError(f"ROI 不在图像范围 {w_img}x{h_img} 内")
+    x, y, w, h = roi_rect if roi_rect is not None else (0, 0, w_img, h_img)
+    img_roi = img[y:y+h, x:x+w]
+    results = {}
+    def timed(name, fn):
+        fn() # 预热：查找表和复用缓冲区
+        starttime = time.perf_counter()
+        for _ in range(repeat):
+            out = fn()
+        results[name] = (time.perf_counter() - starttime) / repeat * 1000
+        print(f"{name}: 平均 {results[name]:.2f} ms")
+        return out
+    mask, _ = timed(f"segment({processor.color_segment_mode})", lambda: processor._segment_colors(img_roi))
+    if mask is not None:
+        mask = mask.copy() # 各阶段的输入依次为上一阶段的输出
+        for i, stage in enumerate(processor.mask_stages):
+            mask = timed(f"{i}:{stage!r}", lambda: stage.apply(mask)).copy()
+    timed("detect(总计)", lambda: processor.detect(img, roi_rect))
+    return results
+
+def check_bayer(img, pattern='RGGB', roi_rect=None, processor=None, tolerance=1.0):
+    """
+    Bayer路径的端到端检查: 将BGR图像取样为Bayer原始数据，经 wrap_bayer 调用 process (含绘制)，
+    与直接处理BGR图像的结果比较形状、颜色和机械臂坐标(误差不超过 tolerance)。返回是否一致。
+    """
+    processor = processor or Processor()
+    _, expected = processor.process(img, roi_rect)
+    img_display, detected = processor.process(processor.wrap_bayer(bgr_to_bayer(img, pattern), pattern), roi_rect)
+    ok = img_display is not None and len(detected) == len(expected) and all(
+        a.shape == b.shape and a.color == b.color and abs(a.robot_x - b.robot_x) <= tolerance and abs(a.robot_y - b.robot_y) <= tolerance
+        for a, b in zip(detected, expected))
+    print(f"Bayer({pattern}) 检查{'通过' if ok else '失败'}: BGR {len(expected)} 个目标，Bayer {len(detected)} 个目标")
+    for obj in detected:
+        print(f"  {obj}")
+    return ok
+
+def batch_main(paths, workers=None):
+    """多进程批量处理图像文件并逐个打印结果，返回按输入顺序排列的结果列表"""
+    from batch import process_many
+    starttime = time.perf_counter()
+    results = process_many(paths, workers=workers)
+    elapsed = time.perf_counter() - starttime
+    for path, objects in zip(paths, results):
+        print(f"{path}: {'无法读取' if objects is None else objects}")
+    print(f"共 {len(paths)} 张, 总耗时 {elapsed:.2f} 秒, 平均 {elapsed / max(len(paths), 1) * 1000:.1f} ms/张")
+    return results
+
 #在此单独测试图像处理算法
+#用法: python processimg.py [图像路径] [--bench-workers] [--bench-stages]
+#      python processimg.py <图像目录或多个图像路径> [--workers=N]   多进程批量处理，只输出检测结果
 if __name__ == "__main__":
-    img_path = '3.jpg'           
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if len(args) > 1 or (args and os.path.isdir(args[0])):
+        if os.path.isdir(args[0]):
+            args = sorted(os.path.join(args[0], f) for f in os.listdir(args[0])
+                          if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))
+        workers = [int(a.split('=', 1)[1]) for a in sys.argv[1:] if a.startswith('--workers=')]
+        batch_main(args, workers=workers[0] if workers else None)
+        sys.exit(0)
+    img_path = args[0] if args else '3.jpg'           
     img_main = cv2.imread(img_path)
     print(f"读取图像: {img_path}, 大小: {img_main.shape[1]}x{img_main.shape[0]}")
     
@@ -323,6 +995,12 @@ if __name__ == "__main__":
         result_img ,_ = processor.process(original_img = img_main)
     endtime = time.time()
     print(f"处理时间: {endtime - starttime:.4f} 秒")
+    if '--bench-workers' in sys.argv:
+        benchmark_strip_workers(img_main, worker_counts=sorted({1, 2, 4, os.cpu_count() or 1}))
+    if '--bench-stages' in sys.argv:
+        benchmark_stages(img_main, processor=processor)
+    if '--check-bayer' in sys.argv:
+        check_bayer(img_main, processor=processor)
 
     display_max_h, display_max_w = 600, 800 
     res_h, res_w = result_img.shape[:2]
@@ -0,0 +1,89 @@
+#耗时统计模块：按阶段记录 perf_counter_ns 耗时，保留最近若干次的滚动窗口并计算均值和分位数
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+
+class StageTimer:
+    """
+    各阶段耗时的滚动窗口统计。每个阶段一个预分配的环形数组(纳秒)，记录一次只是一次数组写入，
+    开销足够低，可在生产环境中常开。统计(均值、p50/p95/p99)只在读取时计算。
+    用法:
+        t0 = time.perf_counter_ns(); ...; timer.record('stage', time.perf_counter_ns() - t0)
+    或
+        with timer.span('stage'): ...
+    """
+    def __init__(self, window=200, enabled=True, dump_interval=0):
+        self.window = window                # 每个阶段保留的最近记录数
+        self.enabled = enabled
+        self.dump_interval = dump_interval  # maybe_dump 的输出间隔(秒)，<=0 表示不输出
+        self._samples = {}   # 阶段名 -> [环形数组, 写入位置, 累计次数]
+        self._lock = threading.Lock() # 分条并行等场景下可能从多个线程记录
+        self._last_dump = time.monotonic()
+
+    def record(self, stage, elapsed_ns):
+        """记录一次阶段耗时(纳秒)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._samples.get(stage)
+            if entry is None:
+                entry = self._samples[stage] = [np.zeros(self.window, dtype=np.int64), 0, 0]
+            entry[0][entry[1]] = elapsed_ns
+            entry[1] = (entry[1] + 1) % self.window
+            entry[2] += 1
+
+    @contextmanager
+    def span(self, stage):
+        """计时上下文，退出时记录耗时"""
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter_ns() - t0)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """返回 {阶段: {count, mean_ms, p50_ms, p95_ms, p99_ms}}，按阶段首次记录的顺序排列"""
+        with self._lock:
+            snapshot = {stage: (buf[:min(total, self.window)].copy(), total) for stage, (buf, _, total) in self._samples.items()}
+        result = {}
+        for stage, (samples, total) in snapshot.items():
+            if len(samples) == 0:
+                continue
+            ms = samples / 1e6
+            p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+            result[stage] = {
+                "count": total,
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+            }
+        return result
+
+    def format_summary(self):
+        """格式化为多行文本"""
+        lines = [f"{'阶段':<16}{'次数':>8}{'均值':>9}{'p50':>9}{'p95':>9}{'p99':>9} (ms)"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<16}{s['count']:>8}{s['mean_ms']:>9.2f}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}")
+        return "\n".join(lines)
+
+    def maybe_dump(self):
+        """距上次输出超过 dump_interval 秒时打印统计并返回文本，否则返回 None。可在每帧调用"""
+        if not self.enabled or self.dump_interval <= 0:
+            return None
+        now = time.monotonic()
+        if now - self._last_dump < self.dump_interval:
+            return None
+        self._last_dump = now
+        text = self.format_summary()
+        print(f"图像处理耗时统计 (最近 {self.window} 次):\n{text}")
+        return text
@@ -0,0 +1,114 @@
+#模板形状分类：启动时从参考图像(assets/shape_templates)计算每种形状的特征，检测时把所有轮廓的特征与整个模板库一次性比较
+#新增产品形状只需放入一张参考图像，文件名即形状名称(如 square.png、hexagon_2.png，末尾的 _数字 用于同一形状的多张参考图)
+import os
+import re
+import numpy as np
+import cv2
+
+TEMPLATE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def resample_contour(contour, n_samples=128):
+    """将闭合轮廓按弧长等间距重采样为 n_samples 个点 (n_samples, 2)"""
+    pts = np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+    closed = np.vstack([pts, pts[:1]])
+    seg = np.hypot(*np.diff(closed, axis=0).T)
+    arc = np.concatenate([[0.0], np.cumsum(seg)])
+    if arc[-1] <= 0:
+        return np.repeat(pts[:1], n_samples, axis=0)
+    t = np.linspace(0, arc[-1], n_samples, endpoint=False)
+    return np.stack([np.interp(t, arc, closed[:, 0]), np.interp(t, arc, closed[:, 1])], axis=1)
+
+def radial_signature(contour, n_samples=128, n_harmonics=16):
+    """
+    归一化径向特征: 沿轮廓等弧长采样的各点到质心的距离(除以平均距离，与尺寸无关)，
+    取其傅里叶变换第1-n_harmonics次谐波的幅值。幅值与起点无关，因此与旋转无关。
+    """
+    pts = resample_contour(contour, n_samples)
+    M = cv2.moments(np.asarray(contour, dtype=np.float32).reshape(-1, 1, 2))
+    center = (M['m10'] / M['m00'], M['m01'] / M['m00']) if M['m00'] != 0 else pts.mean(axis=0)
+    radius = np.hypot(pts[:, 0] - center[0], pts[:, 1] - center[1])
+    radius /= max(radius.mean(), 1e-9)
+    return np.abs(np.fft.rfft(radius)[1:n_harmonics + 1]) / n_samples
+
+# 各Hu不变矩按其归一化中心矩的次数开方，使7个分量处于同一量级，且在0附近连续(对称形状的高阶分量接近0)
+HU_ROOTS = np.array([1, 1 / 2, 1 / 2, 1 / 2, 1 / 4, 1 / 3, 1 / 4])
+
+def hu_signature(contour):
+    """7个Hu不变矩，按 HU_ROOTS 保号开方"""
+    hu = cv2.HuMoments(cv2.moments(np.asarray(contour, dtype=np.float32).reshape(-1, 1, 2))).reshape(-1)
+    return np.sign(hu) * np.abs(hu) ** HU_ROOTS
+
+def template_contour(img):
+    """从参考图像中取出形状轮廓: 灰度 Otsu 二值化(背景以图像边缘像素判断，亮背景时取反)，取面积最大的外轮廓"""
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    border = np.concatenate([binary[0], binary[-1], binary[:, 0], binary[:, -1]])
+    if np.count_nonzero(border) > border.size // 2:
+        binary = cv2.bitwise_not(binary)
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    if not contours:
+        return None
+    return max(contours, key=cv2.contourArea)
+
+
+class ShapeTemplateLibrary:
+    """
+    参考形状库。每张参考图像一个特征向量，组成 (T, K) 的特征矩阵；
+    classify 对所有轮廓计算特征后与整个库做一次距离计算，取最近的参考形状，距离超过 max_distance 时为 'unknown'。
+    method: 'radial' 径向特征(默认) / 'hu' Hu不变矩。
+    """
+    def __init__(self, method='radial', max_distance=0.05, n_samples=128, n_harmonics=16):
+        if method not in ('radial', 'hu'):
+            raise ValueError(f"未知的模板特征: {method}，可选 'radial' / 'hu'")
+        self.method = method
+        self.max_distance = max_distance
+        self.n_samples = n_samples
+        self.n_harmonics = n_harmonics
+        self.labels = np.empty(0, dtype=object)    # 每个参考特征对应的形状名称
+        self.signatures = np.zeros((0, n_harmonics if method == 'radial' else 7))
+        self.sources = []                          # 参考图像路径
+
+    def signature(self, contour):
+        if self.method == 'radial':
+            return radial_signature(contour, self.n_samples, self.n_harmonics)
+        return hu_signature(contour)
+
+    def add(self, label, contour, source=None):
+        """加入一个参考形状"""
+        self.labels = np.append(self.labels, np.array([label], dtype=object))
+        self.signatures = np.vstack([self.signatures, self.signature(contour)])
+        self.sources.append(source)
+
+    def load_directory(self, directory):
+        """读取目录下所有参考图像，返回加载的数量。文件名去掉末尾的 _数字 后作为形状名称"""
+        if not os.path.isdir(directory):
+            print(f"错误：形状模板目录 '{directory}' 不存在！")
+            return 0
+        count = 0
+        for name in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in TEMPLATE_EXTENSIONS:
+                continue
+            path = os.path.join(directory, name)
+            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            contour = template_contour(img) if img is not None else None
+            if contour is None:
+                print(f"警告：无法从形状模板 '{path}' 中提取轮廓，跳过")
+                continue
+            self.add(re.sub(r'_\d+$', '', stem), contour, path)
+            count += 1
+        return count
+
+    def classify(self, contours):
+        """返回 (形状名称数组 (N,), 到最近参考形状的距离 (N,))，模板库为空时全部为 'unknown'"""
+        n = len(contours)
+        if n == 0 or len(self.labels) == 0:
+            return np.full(n, 'unknown', dtype=object), np.full(n, np.inf)
+        features = np.array([self.signature(cnt) for cnt in contours])
+        distances = np.linalg.norm(features[:, None, :] - self.signatures[None, :, :], axis=2) # (N, T)
+        nearest = np.argmin(distances, axis=1)
+        best = distances[np.arange(n), nearest]
+        labels = self.labels[nearest].copy()
+        labels[best > self.max_distance] = 'unknown'
+        return labels, best
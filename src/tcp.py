@@ -5,6 +5,7 @@ import time
 import queue
 import sys
 import os
+import numpy as np
 
 # 导入路径设置 - 相对于项目根目录
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,67 +14,62 @@ sys.path.insert(0, os.path.join(_project_root, "config"))
 from param import *
 
 # --- 数据格式化函数 ---
-def format_object_data_for_plc(detected_object_info):
+# 按形状区分的指令前缀，不在表中的形状使用 "0xU,"
+PLC_SHAPE_PREFIX = {
+    "square": "0xS",
+    "circle": "0xC",
+    "rectangle": "0xH",
+    "diamond": "0xH",
+    "trapezoid": "0xH",
+    "hexagon": "0xH",
+}
+
+def format_objects_for_plc(detected_objects):
     """
-    参数:detected_object_info (dict): 包含 "shape", "color", "robot_x", "robot_y", "angle_deg"。
-    返回:str: 格式化后的字符串，准备发送给PLC。
+    参数:detected_objects (list[DetectedObject]): processimg 的 report_objects 或多帧一致性汇总的结果。
+    返回:list[str]: 每个目标格式化后的字符串，准备发送给PLC。坐标和角度换算对整批目标一次完成。
     """
-    prefix = "0xU,"  # U for Unknown, 默认前缀
-    shape = detected_object_info.get("shape", "unknown")
-    color_code = detected_object_info.get("color", "N/A")[0].upper() if detected_object_info.get("color") != "N/A" else "U"
-    # processimg.py 返回的 robot_x, robot_y 已经是带正负号和两位小数的字符串
-    robot_x = detected_object_info.get("robot_x", "+000.00")
-    robot_y = detected_object_info.get("robot_y", "+000.00")
-    #手动加上相应的偏移值
-    robot_x = float(robot_x) + 0  # 假设偏移值为0.01
-    robot_y = float(robot_y) + 0  # 假设偏移值为0.01
-    robot_x_str = f"{robot_x:+07.2f}"
-    robot_y_str = f"{robot_y:+07.2f}"
-
-    angle_str_formatted = ""
-    angle_deg = detected_object_info.get("angle_deg", 0.0)
-    angle_deg = float(angle_deg) - 0.0  # 假设偏移值为0.01
-    #手动加上相应的偏移值
-    if 0<= angle_deg < 180:
-        angle_deg = angle_deg  # =0-180度为正角度
-    else:
-        angle_deg = angle_deg -360 # C#逻辑：180-360为负角度
-
-    #PLC中角度行程不一样需要微调
+    if not detected_objects:
+        return []
     from param import angle_deg_judge
-    if shape == "square": # 假设这些都用 S，梯形也用S处理角度
-        prefix = "0xS"
-        #匹配PLC中的行程
-        if 0 < angle_deg < 90:
-            angle_deg = angle_deg -90
-        elif 90 < angle_deg < 180:
-            angle_deg = angle_deg - 180
-        elif -180 < angle_deg < -90:
-            angle_deg = angle_deg + 90
-        angle_deg = angle_deg * angle_deg_judge
-
-        angle_str_formatted = f"{angle_deg:+07.2f}" # 例如 +045.00, +270.00
-
-    elif shape == "circle":
-        prefix = "0xC"
-        angle_str_formatted = "+000.00"
-
-    elif shape in ["rectangle", "diamond", "trapezoid", "hexagon"]:
-        prefix = "0xH"
-        #匹配PLC中的行程
-        if 0 < angle_deg < 90:
-            angle_deg = angle_deg -90
-        elif 90 < angle_deg < 180:
-            angle_deg = angle_deg - 180
-        elif -180 < angle_deg < -90:
-            angle_deg = angle_deg + 90
-        angle_deg = angle_deg * angle_deg_judge
-
-        angle_str_formatted = f"{angle_deg:+07.2f}" # 同方形处理
-    
-    print(f"格式化对象: {shape}, 位置: ({robot_x_str}, {robot_y_str}), 角度: {angle_str_formatted}, 颜色: {color_code}")
-    # 最终字符串拼接
-    return f"{prefix},{robot_x_str},{robot_y_str},{angle_str_formatted},{color_code}"
+    shapes = [obj.shape for obj in detected_objects]
+    # 坐标未标定时按 0 处理；手动偏移值为 0
+    robot_x = np.array([obj.robot_x if obj.robot_x is not None else 0.0 for obj in detected_objects]) + 0
+    robot_y = np.array([obj.robot_y if obj.robot_y is not None else 0.0 for obj in detected_objects]) + 0
+
+    angle_deg = np.array([obj.angle_deg for obj in detected_objects], dtype=np.float64) - 0.0
+    # C#逻辑：0-180度为正角度，180-360为负角度
+    angle_deg = np.where((angle_deg >= 0) & (angle_deg < 180), angle_deg, angle_deg - 360)
+    #匹配PLC中的行程
+    angle_deg = np.select(
+        [(0 < angle_deg) & (angle_deg < 90), (90 < angle_deg) & (angle_deg < 180), (-180 < angle_deg) & (angle_deg < -90)],
+        [angle_deg - 90, angle_deg - 180, angle_deg + 90], angle_deg)
+    #PLC中角度行程不一样需要微调
+    angle_deg = angle_deg * angle_deg_judge
+
+    results = []
+    for obj, shape, x, y, angle in zip(detected_objects, shapes, robot_x.tolist(), robot_y.tolist(), angle_deg.tolist()):
+        prefix = PLC_SHAPE_PREFIX.get(shape, "0xU,") # U for Unknown, 默认前缀
+        color_code = obj.color[0].upper() if obj.color != "N/A" else "U"
+        robot_x_str = f"{x:+07.2f}"
+        robot_y_str = f"{y:+07.2f}"
+        if shape == "circle":
+            angle_str_formatted = "+000.00"
+        elif prefix in ("0xS", "0xH"): # 方形和其余多边形的角度处理相同
+            angle_str_formatted = f"{angle:+07.2f}" # 例如 +045.00, +270.00
+        else:
+            angle_str_formatted = ""
+        print(f"格式化对象: {shape}, 位置: ({robot_x_str}, {robot_y_str}), 角度: {angle_str_formatted}, 颜色: {color_code}")
+        # 最终字符串拼接
+        results.append(f"{prefix},{robot_x_str},{robot_y_str},{angle_str_formatted},{color_code}")
+    return results
+
+def format_object_data_for_plc(detected_object):
+    """
+    参数:detected_object (DetectedObject): 单个上报目标。
+    返回:str: 格式化后的字符串，准备发送给PLC。
+    """
+    return format_objects_for_plc([detected_object])[0]
 
 def format_error_for_plc(area_identifier_char):
     """
@@ -168,10 +164,7 @@ class PLCServer:
             handler = self.client_handlers[client_socket]
             area_char = chr(ord('A') + area_num_for_this_detection - 1) if 1 <= area_num_for_this_detection <= 4 else 'X'
             
-            formatted_results = []
-            if detected_objects_list: # 如果有检测到物体
-                for obj_info in detected_objects_list:
-                    formatted_results.append(format_object_data_for_plc(obj_info))
+            formatted_results = format_objects_for_plc(detected_objects_list) # 没有检测到物体时为空列表
             
             # 即使没有物体，也需要通知handler，它可能需要发送一个特定的空消息或不发送
             # 我们让 handler 自己决定如何处理空列表
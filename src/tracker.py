@@ -0,0 +1,179 @@
+#多目标跟踪模块：为检测结果分配跨帧稳定的编号和速度，并在两次全图扫描之间只在已知目标周围的小窗口内重新检测
+import time
+import numpy as np
+
+
+class Track:
+    """单个跟踪目标"""
+    __slots__ = ("track_id", "shape", "color", "center", "velocity", "box_points",
+                 "last_seen", "hits", "misses", "reported", "obj")
+
+    def __init__(self, track_id, obj, now):
+        self.track_id = track_id
+        self.shape = obj["shape"]
+        self.color = obj["color"]
+        self.center = np.array([obj["pixel_x"], obj["pixel_y"]], dtype=np.float64)
+        self.velocity = np.zeros(2)  # 像素/秒
+        self.box_points = obj["box_points"]
+        self.last_seen = now
+        self.hits = 1                # 累计匹配次数
+        self.misses = 0              # 连续未匹配次数
+        self.reported = False        # 是否已上报给PLC，由调用方设置
+        self.obj = obj               # 最近一次的检测结果
+
+    def predict(self, now):
+        """按匀速模型预测 now 时刻的中心位置"""
+        return self.center + self.velocity * (now - self.last_seen)
+
+    def update(self, obj, now, velocity_alpha):
+        center = np.array([obj["pixel_x"], obj["pixel_y"]], dtype=np.float64)
+        dt = now - self.last_seen
+        if dt > 0:
+            # 速度做指数平滑，抑制单帧定位误差
+            self.velocity = velocity_alpha * (center - self.center) / dt + (1 - velocity_alpha) * self.velocity
+        self.center = center
+        self.color = obj["color"]
+        self.box_points = obj["box_points"]
+        self.last_seen = now
+        self.hits += 1
+        self.misses = 0
+        self.obj = obj
+
+
+class ObjectTracker:
+    """
+    在 Processor.detect 之上的跟踪层。按中心距离和形状把检测结果关联到已有目标，分配稳定编号并估计速度。
+    每隔 full_scan_interval 秒(或没有目标、处理区域变化、调用方要求时)做一次全图扫描以发现新目标，
+    其余帧只在每个目标预测位置周围的窗口内调用 detect，稳态下只处理几个小区域。
+    """
+    def __init__(self, processor, full_scan_interval=1.0, match_distance=150, max_misses=3,
+                 window_margin=48, velocity_alpha=0.5):
+        self.processor = processor
+        self.full_scan_interval = full_scan_interval  # 全图扫描间隔(秒)
+        self.match_distance = match_distance          # 关联时允许的最大中心距离(像素)
+        self.max_misses = max_misses                  # 连续未匹配超过该次数的目标被删除
+        self.window_margin = window_margin            # 跟踪窗口相对目标外接矩形的最小外扩(像素)
+        self.velocity_alpha = velocity_alpha          # 速度平滑系数
+        self.tracks = []
+        self._next_id = 1
+        self._last_full_scan = None
+        self._last_roi = None
+        # --- 统计计数 ---
+        self.full_scans = 0
+        self.window_scans = 0
+
+    def reset(self):
+        """清空所有目标，下一帧做全图扫描"""
+        self.tracks = []
+        self._last_full_scan = None
+
+    def _track_window(self, track, now, bounds):
+        """目标预测位置周围的检测窗口 (x, y, w, h)，限制在 bounds=(x, y, w, h) 内"""
+        box = np.asarray(track.box_points, dtype=np.float64).reshape(-1, 2)
+        box = box + (track.predict(now) - track.center)
+        x0, y0 = box.min(axis=0)
+        x1, y1 = box.max(axis=0)
+        # 外扩至少为外接矩形边长的1/4: 窗口面积需明显大于目标面积，否则会被连通域面积占比过滤掉
+        margin = max(self.window_margin, 0.25 * max(x1 - x0, y1 - y0))
+        bx, by, bw, bh = bounds
+        x0, y0 = max(int(x0 - margin), bx), max(int(y0 - margin), by)
+        x1, y1 = min(int(np.ceil(x1 + margin)), bx + bw), min(int(np.ceil(y1 + margin)), by + bh)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def _detect_windows(self, img, roi_rect, now):
+        """在每个目标的跟踪窗口内检测，返回中心位于处理区域内的检测结果(去除窗口重叠造成的重复)"""
+        h_img, w_img = img.shape[:2]
+        bounds = roi_rect if roi_rect is not None else (0, 0, w_img, h_img)
+        bx, by, bw, bh = bounds
+        objects = []
+        for track in self.tracks:
+            # 窗口只限制在图像范围内，跨处理区域边界的目标完整检测，再按中心是否在处理区域内过滤
+            window = self._track_window(track, now, (0, 0, w_img, h_img))
+            if window is None: continue
+            window_objects, _ = self.processor.detect(img, roi_rect=window, window=True) # 窗口已包含完整目标，不外扩
+            for obj in window_objects:
+                if not (bx <= obj["pixel_x"] < bx + bw and by <= obj["pixel_y"] < by + bh):
+                    continue
+                # 相邻目标的窗口重叠时同一目标会被检测两次
+                if any(abs(obj["pixel_x"] - o["pixel_x"]) < 2 and abs(obj["pixel_y"] - o["pixel_y"]) < 2 for o in objects):
+                    continue
+                objects.append(obj)
+        return objects
+
+    def _associate(self, objects, now):
+        """贪心关联: 按 预测中心-检测中心 距离从小到大匹配同形状的目标，返回 {检测序号: 目标}"""
+        if not self.tracks or not objects:
+            return {}
+        predicted = np.array([t.predict(now) for t in self.tracks])
+        centers = np.array([[o["pixel_x"], o["pixel_y"]] for o in objects])
+        dist = np.linalg.norm(centers[:, None, :] - predicted[None, :, :], axis=2)
+        same_shape = np.array([[o["shape"] == t.shape for t in self.tracks] for o in objects])
+        dist[~same_shape | (dist > self.match_distance)] = np.inf
+        matches = {}
+        used_tracks = set()
+        for flat in np.argsort(dist, axis=None):
+            i, j = np.unravel_index(flat, dist.shape)
+            if not np.isfinite(dist[i, j]): break
+            if i in matches or j in used_tracks: continue
+            matches[i] = self.tracks[j]
+            used_tracks.add(j)
+        return matches
+
+    def update(self, img, roi_rect=None, force_full_scan=False):
+        """
+        处理一帧，返回 (objects, roi_rect)，格式与 Processor.detect 相同，每个目标额外包含
+        track_id / velocity (像素/秒) / is_new (本帧首次出现) / reported (此前已上报) 字段。
+        """
+        now = time.monotonic()
+        full_scan = (force_full_scan or not self.tracks or self._last_full_scan is None
+                     or roi_rect != self._last_roi
+                     or now - self._last_full_scan >= self.full_scan_interval)
+        if full_scan:
+            objects, used_roi = self.processor.detect(img, roi_rect=roi_rect)
+            self._last_full_scan = now
+            self._last_roi = roi_rect
+            self.full_scans += 1
+        else:
+            used_roi = self.processor._clip_roi(roi_rect, img.shape[1], img.shape[0])
+            objects = self._detect_windows(img, used_roi, now)
+            self.window_scans += 1
+
+        matches = self._associate(objects, now)
+        matched_tracks = set()
+        for i, obj in enumerate(objects):
+            track = matches.get(i)
+            if track is None:
+                track = Track(self._next_id, obj, now)
+                self._next_id += 1
+                self.tracks.append(track)
+                is_new = True
+            else:
+                track.update(obj, now, self.velocity_alpha)
+                is_new = False
+            matched_tracks.add(track.track_id)
+            obj["track_id"] = track.track_id
+            obj["velocity"] = (float(track.velocity[0]), float(track.velocity[1]))
+            obj["is_new"] = is_new
+            obj["reported"] = track.reported
+        for track in self.tracks:
+            if track.track_id not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return objects, used_roi
+
+    def mark_reported(self, track_ids):
+        """将指定编号的目标标记为已上报，之后的检测结果中 reported 为 True"""
+        track_ids = set(track_ids)
+        for track in self.tracks:
+            if track.track_id in track_ids:
+                track.reported = True
+
+    def stats(self):
+        """返回统计计数字典"""
+        return {
+            "tracks": len(self.tracks),
+            "full_scans": self.full_scans,
+            "window_scans": self.window_scans,
+        }
@@ -15,7 +15,9 @@ from MvCameraControl_class import *
 from cam_operation import CameraOperation
 from tcp import PLCServer
 from processimg import Processor
-from param import PLC_SERVER_HOST, PLC_SERVER_PORT, CALIBRATION_FILE_PATH, SCAN_AREA_FILES
+from param import PLC_SERVER_HOST, PLC_SERVER_PORT, CALIBRATION_FILE_PATH, SCAN_AREA_FILES, SCAN_AREA_ROI_ENABLED
+from param import MULTI_AREA_ENABLED, MULTI_AREA_MAX_AGE, MULTI_AREA_TIMEOUT
+from param import CONSENSUS_ENABLED, CONSENSUS_MIN_FRAMES, CONSENSUS_MAX_FRAMES, CONSENSUS_TIMEOUT, CONSENSUS_MATCH_DISTANCE
 #获取选取设备信息的索引，通过[]之间的字符去解析
 def TxtWrapBy(start_str, end, all):
     start = all.find(start_str)
@@ -257,6 +259,8 @@ class AppUI:
             tkinter.messagebox.showinfo('show info','Camera is Running!')
             return
         self.camera.obj_cam_operation = CameraOperation(self.camera.cam,self.camera.deviceList,self.camera.nSelCamIndex)
+        if MULTI_AREA_ENABLED:
+            self.camera.obj_cam_operation.Enable_multi_area(self.SCAN_AREAS)
         ret = self.camera.obj_cam_operation.Open_device()
         if  0!= ret:
             self.camera.b_is_run = False
@@ -337,10 +341,22 @@ class AppUI:
         detected_objects.clear() # 清除检测到的物体列表
         if command == "START" or command == "SORT":
             self.log_message(f"PLC请求 '{command}', 正在准备图像...")
-            # 从 CamOperation 获取最新的信息
-            # **重要**: CamOperation_class.py 中的 Work_thread 需要更新 self.latest_info
-            time.sleep(0.8)
-            detected_objects = getattr(self.camera.obj_cam_operation, 'latest_info', None)
+            multi_area = self.camera.obj_cam_operation.area_processor is not None and 1 <= area_num <= len(self.SCAN_AREAS)
+            if not multi_area:
+                # 将当前区域传给图像处理线程，后续帧只处理该扫描区域
+                self._set_processing_area(area_num)
+            if multi_area:
+                # 多区域模式：各区域在同一帧上并行处理，区域1等待新帧，同一周期的其余区域直接使用缓存结果
+                detected_objects = self.camera.obj_cam_operation.Get_area_result(area_num, MULTI_AREA_MAX_AGE, MULTI_AREA_TIMEOUT)
+            elif CONSENSUS_ENABLED:
+                # 汇总请求之后的多帧结果，连续多帧一致时提前返回，剔除偶发误检
+                detected_objects = self.camera.obj_cam_operation.Collect_consensus(
+                    CONSENSUS_MIN_FRAMES, CONSENSUS_MAX_FRAMES, CONSENSUS_TIMEOUT, CONSENSUS_MATCH_DISTANCE)
+            else:
+                # 从 CamOperation 获取最新的信息
+                # **重要**: CamOperation_class.py 中的 Work_thread 需要更新 self.latest_info
+                time.sleep(0.8)
+                detected_objects = getattr(self.camera.obj_cam_operation, 'latest_info', None)
             print(f"获取到信息 ")
             
             if detected_objects is None:
@@ -352,6 +368,10 @@ class AppUI:
             # --- 发送结果给PLCServer ---
             self.plc_server.send_results_to_plc(client_socket, detected_objects, area_num)
             print(f"已将检测结果发送到PLC: (detected_objects) 个物体。")
+            # 标记已上报的跟踪目标，后续帧可据此区分新目标和已上报目标
+            tracker = getattr(self.camera.obj_cam_operation, 'tracker', None)
+            if tracker is not None:
+                tracker.mark_reported(obj.track_id for obj in detected_objects if obj.track_id is not None)
 
             # --- SORT 指令的额外逻辑 (发送 Error 或 Over) ---
             if command == "SORT" and sort_payload:
@@ -381,6 +401,15 @@ class AppUI:
                 handler.movement_flag = False
             self.log_message("已响应PLC的STOP指令，相关状态已重置。")
 
+    def _set_processing_area(self, area_num):
+        """根据PLC当前区域编号(1-4)设置相机处理线程使用的ROI，未启用或编号无效时使用全图。"""
+        roi_rect = None
+        if SCAN_AREA_ROI_ENABLED and 1 <= area_num <= len(self.SCAN_AREAS):
+            roi_rect = self.SCAN_AREAS[area_num - 1]
+        if self.camera.obj_cam_operation.roi_rect != roi_rect:
+            self.camera.obj_cam_operation.roi_rect = roi_rect
+            self.log_message(f"处理区域已切换为: {roi_rect if roi_rect else '全图'}")
+
     def _load_scan_areas_from_files(self, file_paths):
         """
         从一系列文本文件中加载扫描区域(ROI)坐标。每个文件应包含两行，每行两个由空格或逗号分隔的整数: